@@ -0,0 +1,66 @@
+"""
+CLI startup benchmark.
+
+    python scripts/bench_startup.py [--db scraper.db] [--runs 20]
+
+Reports the cumulative import time of scraper_cli.cli (from `python -X importtime`) and
+the median wall time of lightweight commands, each in a fresh interpreter, run through the
+console entry point (`python -m scraper_cli`, i.e. fastcli.main).
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def _run(args, env_path: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        env={"PYTHONPATH": env_path, "PATH": ""},
+    )
+    return time.perf_counter() - t0
+
+
+def import_time_us(module: str) -> int:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True, capture_output=True, text=True, env={"PYTHONPATH": str(SRC), "PATH": ""},
+    ).stderr
+    for line in reversed(out.splitlines()):
+        if line.rstrip().endswith(f"| {module}"):
+            return int(line.split("|")[1])
+    return -1
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=None, help="DB to run stats/query against (default: empty temp DB)")
+    ap.add_argument("--runs", type=int, default=20)
+    a = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = a.db or str(Path(tmp) / "bench.db")
+        cli = ["-m", "scraper_cli"]
+        _run([*cli, "stats", "--db-path", db], str(SRC))  # create DB / warm the page cache
+        commands = {
+            "python (baseline)": ["-c", "pass"],
+            "--help": [*cli, "--help"],
+            "stats": [*cli, "stats", "--db-path", db],
+            "query": [*cli, "query", "SELECT COUNT(*) AS n FROM pages", "--db-path", db],
+        }
+        print(f"import scraper_cli.cli: {import_time_us('scraper_cli.cli') / 1000:.1f} ms")
+        for name, args in commands.items():
+            times = [_run(args, str(SRC)) for _ in range(a.runs)]
+            print(f"{name:<18} median {statistics.median(times) * 1000:7.1f} ms"
+                  f"   min {min(times) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
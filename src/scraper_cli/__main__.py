@@ -0,0 +1,3 @@
+from .fastcli import main
+
+main()
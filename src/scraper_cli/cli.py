@@ -1,19 +1,33 @@
 from __future__ import annotations
-import asyncio
-import json
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 import typer
-from rich.console import Console
-from rich.table import Table
-from rich import box
-from .config import ScraperConfig, write_default_config
 from .db import DB
-from .fetcher import crawl
-from .summarizer import summarize_text
+
+# Heavy subsystems (httpx, bs4/lxml, rich, asyncio) are imported inside the commands that
+# need them so `--help` starts fast; `stats` and `query` don't even get here (fastcli.main
+# answers them without typer). See scripts/bench_startup.py.
 
 app = typer.Typer(help="Modern interactive web scraper CLI")
-console = Console()
+
+
+class _LazyConsole:
+    """rich Console created on first use."""
+    _console = None
+
+    def __getattr__(self, name):
+        if _LazyConsole._console is None:
+            from rich.console import Console
+            _LazyConsole._console = Console()
+        return getattr(_LazyConsole._console, name)
+
+
+console = _LazyConsole()
+
+
+def _open_readonly(db_path: Path) -> DB:
+    # read-only commands skip schema setup (a write transaction) on existing DBs
+    return DB(db_path, readonly=True) if Path(db_path).exists() else DB(db_path)
 
 @app.command()
 def init(
@@ -21,6 +35,7 @@ def init(
     db_path: Path = typer.Option("scraper.db", help="SQLite file"),
 ):
     """Create default config and SQLite DB."""
+    from .config import write_default_config
     write_default_config(config_path)
     DB(db_path).close()
     console.print(f"[green]Created[/green] {config_path} and {db_path}")
@@ -31,18 +46,162 @@ def run(
     db_path: Path = typer.Option("scraper.db"),
     max_pages: Optional[int] = typer.Option(None, help="Stop after N pages"),
     depth: Optional[int] = typer.Option(None, help="Override max_depth in config"),
+    recrawl: bool = typer.Option(False, help="Only refetch URLs that are due (change-frequency schedule)"),
+    budget: Optional[int] = typer.Option(None, help="Pages per recrawl run (default: recrawl_budget)"),
+    shard_dir: Optional[Path] = typer.Option(None, help="Write this run to its own shard file; db_path becomes the catalog"),
+    replay: Optional[List[Path]] = typer.Option(
+        None, exists=True, help="Serve requests from WARC files/dirs (or a DB's WARC index) instead of the network"
+    ),
 ):
     """Run crawler (fetch + parse)."""
+    import asyncio
+    from .config import ScraperConfig
+    from .fetcher import crawl
     cfg = ScraperConfig.load(config_path)
     if depth is not None:
         cfg.max_depth = depth
+    if recrawl and budget is not None:
+        cfg.recrawl_budget = budget
+    transport = None
+    if replay:
+        from .warc import WarcReader, WarcReplayTransport
+        reader = WarcReader()
+        for p in replay:
+            if p.suffix == ".db":
+                reader.db = DB(p, readonly=True)
+            else:
+                for f in sorted(p.glob("*.warc.gz")) if p.is_dir() else [p]:
+                    reader.add_file(f)
+        transport = WarcReplayTransport(reader)
     db = DB(db_path)
     try:
-        asyncio.run(crawl(cfg, db, max_pages=max_pages))
+        if shard_dir is None:
+            asyncio.run(crawl(cfg, db, max_pages=max_pages, recrawl=recrawl, transport=transport))
+        else:
+            from .shards import open_shard
+            job_id = db.create_job(cfg.dump(), depth, max_pages)
+            db.update_job_status(job_id, "running")
+            shard = open_shard(db, shard_dir, job_id)
+            status = "failed"
+            try:
+                asyncio.run(crawl(cfg, shard, max_pages=max_pages, job_id=job_id, recrawl=recrawl,
+                                  transport=transport))
+                status = "succeeded"
+            finally:
+                shard.close()
+                db.update_job_status(job_id, status)
+            console.print(f"Job {job_id} written to shard {shard.path}")
     finally:
         db.close()
+        if replay:
+            reader.close()
+            if reader.db is not None:
+                reader.db.close()
     console.print("[green]Done.[/green]")
 
+@app.command("warc-get")
+def warc_get(
+    url: str = typer.Argument(..., help="Archived URL"),
+    db_path: Path = typer.Option("scraper.db", help="DB holding the WARC offset index"),
+    body: bool = typer.Option(False, help="Print the decoded body too"),
+):
+    """Print the newest archived response for a URL (one record read via mmap, no full-file decode)."""
+    from .warc import WarcReader
+    db = _open_readonly(db_path)
+    reader = WarcReader(db)
+    try:
+        rec = reader.get(url)
+        if rec is None:
+            console.print(f"[yellow]Not archived:[/yellow] {url}")
+            raise typer.Exit(1)
+        console.print(f"[bold]{rec.status}[/bold] {rec.url}  [dim]{rec.date}[/dim]", highlight=False)
+        for k, v in rec.headers:
+            console.print(f"{k}: {v}", markup=False, highlight=False)
+        if body:
+            console.print()
+            console.print(rec.text, markup=False, highlight=False)
+    finally:
+        reader.close()
+        db.close()
+
+@app.command("warc-index")
+def warc_index(
+    paths: List[Path] = typer.Argument(..., exists=True, help=".warc.gz files (gzip per record)"),
+    db_path: Path = typer.Option("scraper.db"),
+):
+    """Index response records of existing WARC files into the DB for random access and replay."""
+    from .warc import index_warc
+    db = DB(db_path)
+    try:
+        for p in paths:
+            n = index_warc(db, p)
+            console.print(f"Indexed {n} records from {p}")
+    finally:
+        db.close()
+
+@app.command()
+def merge(
+    db_path: Path = typer.Option("scraper.db", help="Catalog DB"),
+    job_id: Optional[List[int]] = typer.Option(None, help="Only merge these jobs' shards"),
+    keep: bool = typer.Option(False, help="Keep shard files after merging"),
+):
+    """Fold per-job shards into the catalog DB (pages upserted by URL, newest fetch wins)."""
+    from .shards import merge_shards
+    from .search import reindex
+    db = DB(db_path)
+    try:
+        n = merge_shards(db, job_id or None, delete=not keep)
+        if n:
+            reindex(db)
+    finally:
+        db.close()
+    console.print(f"[green]Merged[/green] {n} shard(s) into {db_path}")
+
+@app.command()
+def vacuum(
+    db_path: Path = typer.Option("scraper.db", help="Catalog DB"),
+):
+    """VACUUM the catalog and every unmerged shard."""
+    from .shards import vacuum_all
+    db = DB(db_path)
+    try:
+        n = vacuum_all(db)
+    finally:
+        db.close()
+    console.print(f"[green]Vacuumed[/green] {n} file(s)")
+
+@app.command()
+def reextract(
+    config_path: Path = typer.Option("config.json", exists=True),
+    db_path: Path = typer.Option("scraper.db"),
+    workers: Optional[int] = typer.Option(None, help="Worker processes (default: CPU count)"),
+    chunk_size: int = typer.Option(200, help="Pages per worker task / write transaction"),
+    all_pages: bool = typer.Option(False, "--all", help="Also pages already extracted with this config"),
+):
+    """Re-run extract rules over stored pages (no network) into a new job."""
+    import asyncio
+    from .config import ScraperConfig
+    from .reextract import reextract as run_reextract
+    cfg = ScraperConfig.load(config_path)
+    db = DB(db_path)
+    try:
+        job_id = db.create_job(cfg.dump(), None, None)
+        db.update_job_status(job_id, "running")
+        try:
+            stats = asyncio.run(run_reextract(
+                cfg, db, job_id=job_id, workers=workers, chunk_size=chunk_size, only_new=not all_pages
+            ))
+        except BaseException as ex:
+            db.update_job_status(job_id, "failed")
+            db.add_job_event(job_id, "error", {"message": repr(ex)})
+            raise
+        db.record_job_progress(job_id, [], pages=stats["pages"], items=stats["items"])
+        db.update_job_status(job_id, "succeeded")
+        db.add_job_event(job_id, "done", {"message": "reextract completed", **stats})
+    finally:
+        db.close()
+    console.print(f"[green]Job {job_id}:[/green] {stats['items']} items from {stats['pages']} pages")
+
 @app.command()
 def summarize(
     db_path: Path = typer.Option("scraper.db"),
@@ -51,44 +210,53 @@ def summarize(
     sentences: int = typer.Option(5, help="Number of sentences")
 ):
     """Create extractive summaries."""
+    from .summarizer import SummaryPipeline
     db = DB(db_path)
-    cur = db.conn.cursor()
-
-    if scope_collection:
-        cur.execute("SELECT html FROM pages WHERE html IS NOT NULL AND error IS NULL")
-        texts = [r["html"] or "" for r in cur.fetchall()]
-        text = "\n".join(texts)[:1_000_000]  # clamp
-        summ = summarize_text(text, sentences)
-        db.insert_summary(scope="collection", key="all", text=summ)
-        console.print(summ)
-    elif url:
-        cur.execute("SELECT html FROM pages WHERE url = ?", (url,))
-        row = cur.fetchone()
-        if not row or not row["html"]:
-            typer.echo("No HTML found for that URL")
-            raise typer.Exit(code=1)
-        summ = summarize_text(row["html"], sentences)
-        db.insert_summary(scope="page", key=url, text=summ)
+    pipeline = SummaryPipeline(db)
+    try:
+        if scope_collection:
+            summ = pipeline.summarize_collection(sentences)
+        elif url:
+            summ = pipeline.summarize_page(url, sentences)
+            if summ is None:
+                typer.echo("No HTML found for that URL")
+                raise typer.Exit(code=1)
+        else:
+            typer.echo("Provide --url or --scope-collection")
+            raise typer.Exit(code=2)
         console.print(summ)
-    else:
-        typer.echo("Provide --url or --scope-collection")
-        raise typer.Exit(code=2)
-    db.close()
+    finally:
+        db.close()
 
 @app.command("stats")
 def stats_cmd(
     db_path: Path = typer.Option("scraper.db")
 ):
     """Show DB stats."""
+    from .fastcli import format_stats
+    db = _open_readonly(db_path)
+    try:
+        typer.echo(format_stats(db.stats()))
+    finally:
+        db.close()
+
+@app.command("compact-events")
+def compact_events(
+    db_path: Path = typer.Option("scraper.db"),
+    older_than_days: float = typer.Option(7, help="Compact events older than this"),
+    vacuum: bool = typer.Option(False, help="VACUUM afterwards to return space to the OS"),
+):
+    """Fold old per-page job events of finished jobs into one summary event per job."""
+    from datetime import datetime, timedelta
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat(timespec="seconds") + "Z"
     db = DB(db_path)
-    s = db.stats()
-    table = Table(title="Scraper Stats", box=box.SIMPLE)
-    table.add_column("Metric", style="bold")
-    table.add_column("Count", justify="right")
-    for k, v in s.items():
-        table.add_row(k, str(v))
-    console.print(table)
-    db.close()
+    try:
+        n = db.compact_job_events(cutoff)
+        if vacuum:
+            db.conn.execute("VACUUM")
+    finally:
+        db.close()
+    console.print(f"[green]Compacted[/green] {n} events older than {cutoff}")
 
 @app.command()
 def export(
@@ -98,6 +266,7 @@ def export(
 ):
     """Export extracted items."""
     import csv
+    import json
     db = DB(db_path)
     cur = db.conn.cursor()
     cur.execute("SELECT data_json FROM items")
@@ -118,28 +287,90 @@ def export(
             w.writerow({k: r.get(k, "") for k in keys})
     console.print(f"[green]Wrote[/green] {outfile}")
 
+@app.command()
+def materialize(
+    config_path: Path = typer.Option("config.json", exists=True),
+    db_path: Path = typer.Option("scraper.db"),
+    job_id: Optional[int] = typer.Option(None, help="Only items from this job"),
+):
+    """Create the config's typed items table and fill it from stored items."""
+    from .config import ScraperConfig
+    from .typed_items import TypedItemsTable
+    cfg = ScraperConfig.load(config_path)
+    cfg.typed_items = True
+    table = TypedItemsTable.from_config(cfg)
+    if table is None:
+        typer.echo("Config has no extract rules")
+        raise typer.Exit(code=1)
+    db = DB(db_path)
+    try:
+        db.ensure_typed_items(table)
+        n = db.backfill_typed_items(table, job_id=job_id)
+    finally:
+        db.close()
+    console.print(f"[green]Materialized[/green] {n} items into {table.name}")
+
 @app.command()
 def query(
     db_path: Path = typer.Option("scraper.db"),
     sql: str = typer.Argument(..., help="SELECT ..."),
-    limit: int = typer.Option(25)
+    limit: int = typer.Option(25),
+    shards: bool = typer.Option(False, help="Attach unmerged shards; query all_pages/all_items/all_links"),
 ):
-    """Run a quick SELECT query and pretty-print."""
-    db = DB(db_path)
+    """Run a quick SELECT query and print the rows tab-separated."""
+    from .fastcli import format_rows
+    if shards:
+        from .shards import open_view
+        try:
+            db = open_view(db_path)
+        except ValueError as ex:
+            typer.echo(str(ex))
+            raise typer.Exit(code=1)
+    else:
+        db = _open_readonly(db_path)
     cur = db.conn.cursor()
     cur.execute(sql)
     rows = cur.fetchmany(limit)
     if not rows:
-        console.print("[yellow]No rows[/yellow]")
+        typer.echo("No rows")
+        return
+    typer.echo(format_rows(rows[0].keys(), rows))
+    db.close()
+
+@app.command()
+def search(
+    q: str = typer.Argument(..., help="Full-text query (FTS5 syntax)"),
+    db_path: Path = typer.Option("scraper.db"),
+    kind: str = typer.Option("all", help="all|pages|items"),
+    limit: int = typer.Option(20),
+    reindex_first: bool = typer.Option(False, "--reindex", help="Index stored pages/items first"),
+):
+    """Ranked full-text search over crawled pages and items."""
+    from rich.table import Table
+    from rich import box
+    from rich.markup import escape
+    from .search import reindex
+    db = DB(db_path)
+    try:
+        if not db.fts:
+            typer.echo("This SQLite build has no FTS5 support")
+            raise typer.Exit(code=1)
+        if reindex_first:
+            n = reindex(db)
+            console.print(f"[green]Indexed[/green] {n} records")
+        hits = db.search(q, kind=kind, limit=limit, marks=("\x02", "\x03"))
+    finally:
+        db.close()
+    if not hits:
+        console.print("[yellow]No matches[/yellow]")
         return
-    columns = rows[0].keys()
     table = Table(box=box.MINIMAL_HEAVY_HEAD)
-    for c in columns:
+    for c in ("kind", "url", "title", "snippet"):
         table.add_column(c)
-    for r in rows:
-        table.add_row(*[str(r[c]) if r[c] is not None else "" for c in columns])
+    for h in hits:
+        snippet = escape(h["snippet"] or "").replace("\x02", "[bold yellow]").replace("\x03", "[/]")
+        table.add_row(h["kind"], escape(h["url"] or ""), escape(h["title"] or ""), snippet)
     console.print(table)
-    db.close()
 
 def main():
     app()
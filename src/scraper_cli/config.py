@@ -1,6 +1,7 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from typing import Any, Dict, List, Optional
+import hashlib
 import json
 import os
 from pathlib import Path
@@ -11,6 +12,8 @@ class ExtractRule:
     selector: str
     type: str = "text"  # "text" | "attr"
     attr: Optional[str] = None  # if type == "attr"
+    dtype: str = "text"  # column type in the typed items table: "text" | "integer" | "real"
+    index: bool = False  # index this column in the typed items table
 
 @dataclass
 class LinkFilters:
@@ -34,38 +37,48 @@ class ScraperConfig:
     item_selector: Optional[str] = None
     extract: List[ExtractRule] = field(default_factory=list)
     etag_cache: bool = True
+    # Per-host AIMD concurrency: start at `concurrency`, grow up to `max_concurrency`
+    adaptive_concurrency: bool = False
+    max_concurrency: int = 32
+    # Bounded retries with jittered exponential backoff (429/5xx/timeouts)
+    max_retries: int = 3
+    backoff_base_ms: int = 500
+    backoff_max_ms: int = 30_000
+    # Maintain the FTS5 search index (pages_fts/items_fts) while crawling
+    search_index: bool = True
+    # Recrawl scheduling: pages are revisited after their estimated time-to-change
+    recrawl_budget: int = 1000
+    recrawl_min_interval_s: int = 3600
+    recrawl_max_interval_s: int = 30 * 86400
+    # Seed the frontier from robots.txt Sitemap: lines (or /sitemap.xml)
+    use_sitemaps: bool = False
+    max_sitemaps: int = 50
+    # Also write items into a typed table (one column per extract rule)
+    typed_items: bool = False
+    typed_items_table: Optional[str] = None  # default: items_<name>
+    # Near-duplicate / crawler-trap detection per URL template
+    trap_detection: bool = False
+    near_dup_threshold: int = 3  # max differing SimHash bits
+    trap_min_samples: int = 5
+    trap_dup_ratio: float = 0.8  # prune at this near-dup ratio, demote at half of it
+    max_query_variants: int = 50
+    # Parse HTML bodies chunk by chunk as they download; links are queued before the body completes
+    stream_parse: bool = False
+    # Append every HTTP response to rotating WARC files in this directory (offsets indexed in the DB)
+    warc_dir: Optional[str] = None
+    warc_max_bytes: int = 1_000_000_000  # start a new .warc.gz file past this size
 
     @staticmethod
     def load(path: Path) -> "ScraperConfig":
-        data = json.loads(Path(path).read_text())
-        # Simple dict→dataclass conversion
-        lf = data.get("link_filters", {}) or {}
-        extracts = [ExtractRule(**e) for e in data.get("extract", [])]
-        return ScraperConfig(
-            name=data.get("name", "scraper"),
-            user_agent=data.get("user_agent", "ScraperCLI/0.1"),
-            concurrency=int(data.get("concurrency", 5)),
-            delay_ms_min=int(data.get("delay_ms_min", 200)),
-            delay_ms_max=int(data.get("delay_ms_max", 600)),
-            max_depth=int(data.get("max_depth", 1)),
-            follow_same_domain_only=bool(data.get("follow_same_domain_only", True)),
-            respect_robots_txt=bool(data.get("respect_robots_txt", True)),
-            allowed_domains=list(data.get("allowed_domains", [])),
-            seeds=list(data.get("seeds", [])),
-            link_filters=LinkFilters(
-                allow_regex=lf.get("allow_regex", []) or [],
-                deny_regex=lf.get("deny_regex", []) or [],
-            ),
-            headers=dict(data.get("headers", {})),
-            item_selector=data.get("item_selector"),
-            extract=extracts,
-            etag_cache=bool(data.get("etag_cache", True)),
-        )
+        return ScraperConfig.from_dict(json.loads(Path(path).read_text()))
 
     @staticmethod
     def load_json_str(s: str) -> "ScraperConfig":
-        data = json.loads(s)
-        # (same as ScraperConfig.load but from dict)
+        return ScraperConfig.from_dict(json.loads(s))
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "ScraperConfig":
+        # Simple dict→dataclass conversion
         lf = data.get("link_filters", {}) or {}
         extracts = [ExtractRule(**e) for e in data.get("extract", [])]
         return ScraperConfig(
@@ -87,13 +100,43 @@ class ScraperConfig:
             item_selector=data.get("item_selector"),
             extract=extracts,
             etag_cache=bool(data.get("etag_cache", True)),
+            adaptive_concurrency=bool(data.get("adaptive_concurrency", False)),
+            max_concurrency=int(data.get("max_concurrency", 32)),
+            max_retries=int(data.get("max_retries", 3)),
+            backoff_base_ms=int(data.get("backoff_base_ms", 500)),
+            backoff_max_ms=int(data.get("backoff_max_ms", 30_000)),
+            search_index=bool(data.get("search_index", True)),
+            recrawl_budget=int(data.get("recrawl_budget", 1000)),
+            recrawl_min_interval_s=int(data.get("recrawl_min_interval_s", 3600)),
+            recrawl_max_interval_s=int(data.get("recrawl_max_interval_s", 30 * 86400)),
+            use_sitemaps=bool(data.get("use_sitemaps", False)),
+            max_sitemaps=int(data.get("max_sitemaps", 50)),
+            typed_items=bool(data.get("typed_items", False)),
+            typed_items_table=data.get("typed_items_table"),
+            trap_detection=bool(data.get("trap_detection", False)),
+            near_dup_threshold=int(data.get("near_dup_threshold", 3)),
+            trap_min_samples=int(data.get("trap_min_samples", 5)),
+            trap_dup_ratio=float(data.get("trap_dup_ratio", 0.8)),
+            max_query_variants=int(data.get("max_query_variants", 50)),
+            stream_parse=bool(data.get("stream_parse", False)),
+            warc_dir=data.get("warc_dir"),
+            warc_max_bytes=int(data.get("warc_max_bytes", 1_000_000_000)),
         )
 
+    def extract_hash(self) -> str:
+        """Identifies the extraction settings, so items can be matched to the rules that made them."""
+        spec = {"item_selector": self.item_selector, "extract": [asdict(r) for r in self.extract]}
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
     def dump(self) -> str:
         def rule_to_dict(r: ExtractRule) -> Dict[str, Any]:
             d = {"name": r.name, "selector": r.selector, "type": r.type}
             if r.attr:
                 d["attr"] = r.attr
+            if r.dtype != "text":
+                d["dtype"] = r.dtype
+            if r.index:
+                d["index"] = True
             return d
         data = {
             "name": self.name,
@@ -114,6 +157,27 @@ class ScraperConfig:
             "item_selector": self.item_selector,
             "extract": [rule_to_dict(e) for e in self.extract],
             "etag_cache": self.etag_cache,
+            "adaptive_concurrency": self.adaptive_concurrency,
+            "max_concurrency": self.max_concurrency,
+            "max_retries": self.max_retries,
+            "backoff_base_ms": self.backoff_base_ms,
+            "backoff_max_ms": self.backoff_max_ms,
+            "search_index": self.search_index,
+            "recrawl_budget": self.recrawl_budget,
+            "recrawl_min_interval_s": self.recrawl_min_interval_s,
+            "recrawl_max_interval_s": self.recrawl_max_interval_s,
+            "use_sitemaps": self.use_sitemaps,
+            "max_sitemaps": self.max_sitemaps,
+            "typed_items": self.typed_items,
+            "typed_items_table": self.typed_items_table,
+            "trap_detection": self.trap_detection,
+            "near_dup_threshold": self.near_dup_threshold,
+            "trap_min_samples": self.trap_min_samples,
+            "trap_dup_ratio": self.trap_dup_ratio,
+            "max_query_variants": self.max_query_variants,
+            "stream_parse": self.stream_parse,
+            "warc_dir": self.warc_dir,
+            "warc_max_bytes": self.warc_max_bytes,
         }
         return json.dumps(data, indent=2)
 
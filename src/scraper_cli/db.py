@@ -1,10 +1,13 @@
 from __future__ import annotations
 import sqlite3
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 import json
+import hashlib
+import threading
 from contextlib import contextmanager
 from datetime import datetime
+from .typed_items import TypedItemsTable, is_reserved_table
 
 def _now_iso() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
@@ -40,7 +43,88 @@ CREATE TABLE IF NOT EXISTS summaries (
   scope TEXT,
   key TEXT,
   text TEXT,
-  created_at TEXT
+  created_at TEXT,
+  content_hash TEXT,
+  sentences INTEGER
+);
+-- visible text extracted once per distinct page body
+CREATE TABLE IF NOT EXISTS page_texts (
+  content_hash TEXT PRIMARY KEY,
+  text TEXT,
+  title TEXT                      -- set once the page is search-indexed
+);
+-- incremental corpus term statistics (which page bodies are counted, and the totals)
+CREATE TABLE IF NOT EXISTS corpus_pages (
+  url TEXT PRIMARY KEY,
+  content_hash TEXT
+);
+-- per-URL fetch history and recrawl schedule
+CREATE TABLE IF NOT EXISTS fetch_history (
+  id INTEGER PRIMARY KEY,
+  url TEXT,
+  status INTEGER,
+  content_hash TEXT,
+  changed INTEGER,
+  ts TEXT
+);
+CREATE TABLE IF NOT EXISTS url_schedule (
+  url TEXT PRIMARY KEY,
+  content_hash TEXT,
+  checks INTEGER,
+  changes INTEGER,
+  first_checked TEXT,
+  last_checked TEXT,
+  last_changed TEXT,
+  change_rate REAL,               -- estimated changes per second
+  next_due TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_url_schedule_due ON url_schedule(next_due);
+-- per-URL-template crawl statistics (trap / near-duplicate detection)
+CREATE TABLE IF NOT EXISTS url_patterns (
+  template TEXT PRIMARY KEY,
+  pages INTEGER,
+  near_dups INTEGER,
+  query_variants INTEGER,
+  pruned INTEGER,
+  updated_at TEXT
+);
+-- pages run through an extract config, with or without items (see reextract)
+CREATE TABLE IF NOT EXISTS extractions (
+  page_id INTEGER,
+  config_hash TEXT,
+  content_hash TEXT,
+  items INTEGER,
+  extracted_at TEXT,
+  PRIMARY KEY (page_id, config_hash)
+);
+-- query combinations seen per path template (see traps.TrapDetector)
+CREATE TABLE IF NOT EXISTS url_pattern_combos (
+  path_template TEXT,
+  combo TEXT,
+  PRIMARY KEY (path_template, combo)
+);
+-- per-job shard files (catalog side)
+CREATE TABLE IF NOT EXISTS shards (
+  job_id INTEGER PRIMARY KEY,
+  path TEXT,
+  status TEXT,                    -- active|merged
+  created_at TEXT,
+  merged_at TEXT
+);
+CREATE TABLE IF NOT EXISTS warc_records (
+  id INTEGER PRIMARY KEY,
+  url TEXT NOT NULL,              -- WARC-Target-URI
+  file TEXT NOT NULL,             -- absolute path of the .warc.gz file
+  offset INTEGER NOT NULL,        -- byte offset of the record's gzip member
+  length INTEGER NOT NULL,        -- compressed length of that member
+  status INTEGER,
+  content_type TEXT,
+  warc_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_warc_records_url ON warc_records(url, id);
+CREATE TABLE IF NOT EXISTS corpus_terms (
+  term TEXT PRIMARY KEY,
+  tf INTEGER
 );
 -- NEW: jobs table
 CREATE TABLE IF NOT EXISTS jobs (
@@ -50,7 +134,14 @@ CREATE TABLE IF NOT EXISTS jobs (
   updated_at TEXT,
   config_json TEXT,
   max_pages INTEGER,
-  depth INTEGER
+  depth INTEGER,
+  started_at TEXT,
+  finished_at TEXT,
+  pages_count INTEGER DEFAULT 0,  -- running progress counters, updated in batches
+  items_count INTEGER DEFAULT 0,
+  errors_count INTEGER DEFAULT 0,
+  bytes_count INTEGER DEFAULT 0,
+  pages_per_s REAL
 );
 -- NEW: job events (append-only)
 CREATE TABLE IF NOT EXISTS job_events (
@@ -60,18 +151,122 @@ CREATE TABLE IF NOT EXISTS job_events (
   payload TEXT,
   ts TEXT
 );
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events(job_id, id);
+"""
+
+# Full-text index; optional because some SQLite builds ship without FTS5
+# pages_fts is an external-content index over page_texts, so page text is stored only once;
+# pages_fts_state records which body each page was indexed with (needed to delete it again)
+FTS_SCHEMA = """
+CREATE VIEW IF NOT EXISTS pages_fts_content AS
+  SELECT p.id AS id, COALESCE(t.title, '') AS title, t.text AS body
+  FROM pages p JOIN page_texts t ON t.content_hash = p.content_hash;
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+  title, body, content = 'pages_fts_content', content_rowid = 'id', tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS pages_fts_state (
+  page_id INTEGER PRIMARY KEY,
+  content_hash TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+  body, tokenize = 'porter unicode61'
+);
 """
 
 class DB:
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, readonly: bool = False, check_same_thread: bool = True):
         self.path = path
-        self.conn = sqlite3.connect(path)
+        self.readonly = readonly
+        # shards: a read-only catalog DB consulted for pages fetched by earlier jobs (see shards.open_shard)
+        self.prior: Optional[DB] = None
+        if readonly:
+            # WAL readers see the last committed snapshot and never wait on the writer
+            uri = Path(path).resolve().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA query_only = 1")
+            self.fts = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'pages_fts'"
+            ).fetchone() is not None
+            return
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
         self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA busy_timeout = 5000")
         self.conn.executescript(SCHEMA)
+        self._migrate()
+        try:
+            self._create_fts()
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
         self.conn.commit()
 
+    def _create_fts(self) -> None:
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages_fts'").fetchone()
+        legacy = row is not None and "content_rowid" not in row["sql"]
+        if legacy:
+            # one-off: the first pages_fts kept its own copy of title/body; keep the titles, drop the copy
+            self.conn.execute(
+                """UPDATE page_texts SET title = (SELECT f.title FROM pages_fts f
+                                                  WHERE f.content_hash = page_texts.content_hash LIMIT 1)
+                   WHERE title IS NULL"""
+            )
+            self.conn.execute("DROP TABLE pages_fts")
+        self.conn.executescript(FTS_SCHEMA)
+        if legacy:
+            # rebuild reads every row of pages_fts_content; pin NULL titles so they match it later
+            self.conn.execute("UPDATE page_texts SET title = '' WHERE title IS NULL")
+            self.conn.execute("INSERT INTO pages_fts(pages_fts) VALUES ('rebuild')")
+            self.conn.execute("DELETE FROM pages_fts_state")
+            self.conn.execute(
+                """INSERT INTO pages_fts_state(page_id, content_hash)
+                   SELECT p.id, p.content_hash FROM pages p
+                   JOIN page_texts t ON t.content_hash = p.content_hash"""
+            )
+
+    def _ensure_columns(self, table: str, columns: Dict[str, str]) -> List[str]:
+        have = {r["name"] for r in self.conn.execute(f'PRAGMA table_info("{table}")')}
+        added = []
+        for name, decl in columns.items():
+            if name not in have:
+                self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {decl}')
+                added.append(name)
+        return added
+
+    def _migrate(self) -> None:
+        # Columns added after the first release; CREATE TABLE IF NOT EXISTS won't add them
+        self._ensure_columns("summaries", {"content_hash": "TEXT", "sentences": "INTEGER"})
+        self._ensure_columns("pages", {"simhash": "INTEGER"})
+        self._ensure_columns("page_texts", {"title": "TEXT"})
+        self._ensure_columns("items", {"content_hash": "TEXT", "config_hash": "TEXT"})
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_items_page_config ON items(page_id, config_hash)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_summaries_key ON summaries(scope, key, content_hash)"
+        )
+        added = self._ensure_columns("jobs", {
+            "started_at": "TEXT", "finished_at": "TEXT",
+            "pages_count": "INTEGER DEFAULT 0", "items_count": "INTEGER DEFAULT 0",
+            "errors_count": "INTEGER DEFAULT 0", "bytes_count": "INTEGER DEFAULT 0",
+            "pages_per_s": "REAL",
+        })
+        if "pages_count" in added:
+            # one-off: derive counters for existing jobs from their events
+            self.conn.execute(
+                """UPDATE jobs SET
+                     pages_count = (SELECT COUNT(*) FROM job_events e
+                                    WHERE e.job_id = jobs.id AND e.type = 'page'),
+                     errors_count = (SELECT COUNT(*) FROM job_events e WHERE e.job_id = jobs.id
+                                     AND e.type = 'page' AND json_extract(e.payload, '$.error') IS NOT NULL),
+                     items_count = (SELECT COALESCE(SUM(json_extract(e.payload, '$.count')), 0)
+                                    FROM job_events e WHERE e.job_id = jobs.id AND e.type = 'items')"""
+            )
+
     def close(self):
         self.conn.close()
+        if self.prior is not None:
+            self.prior.close()
 
     def upsert_page(
         self,
@@ -120,7 +315,10 @@ class DB:
     def get_page(self, url: str) -> Optional[sqlite3.Row]:
         cur = self.conn.cursor()
         cur.execute("SELECT * FROM pages WHERE url = ?", (url,))
-        return cur.fetchone()
+        row = cur.fetchone()
+        if row is None and self.prior is not None:
+            row = self.prior.get_page(url)
+        return row
 
     def insert_links(self, from_page_id: int, to_urls: Iterable[str]) -> None:
         cur = self.conn.cursor()
@@ -139,14 +337,106 @@ class DB:
     #     )
     #     self.conn.commit()
 
-    def insert_summary(self, scope: str, key: str, text: str) -> None:
+    def insert_summary(
+        self, scope: str, key: str, text: str,
+        content_hash: Optional[str] = None, sentences: Optional[int] = None,
+    ) -> None:
+        cur = self.conn.cursor()
+        cur.execute(
+            """INSERT INTO summaries(scope, key, text, created_at, content_hash, sentences)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (scope, key, text, _now_iso(), content_hash, sentences)
+        )
+        self.conn.commit()
+
+    def get_summary(self, scope: str, key: str, content_hash: str, sentences: int) -> Optional[str]:
         cur = self.conn.cursor()
         cur.execute(
-            "INSERT INTO summaries(scope, key, text, created_at) VALUES (?, ?, ?, ?)",
-            (scope, key, text, _now_iso())
+            """SELECT text FROM summaries WHERE scope=? AND key=? AND content_hash=? AND sentences=?
+               ORDER BY id DESC LIMIT 1""",
+            (scope, key, content_hash, sentences)
+        )
+        row = cur.fetchone()
+        return row["text"] if row else None
+
+    # --- page text / corpus statistics ---
+    def get_page_text(self, content_hash: str) -> Optional[str]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT text FROM page_texts WHERE content_hash=?", (content_hash,))
+        row = cur.fetchone()
+        return row["text"] if row else None
+
+    def get_page_title(self, content_hash: str) -> Optional[str]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT title FROM page_texts WHERE content_hash=?", (content_hash,))
+        row = cur.fetchone()
+        return row["title"] if row else None
+
+    def put_page_text(self, content_hash: str, text: str, title: Optional[str] = None) -> None:
+        # text never changes for a hash; a missing title is filled in once (never overwritten,
+        # since pages_fts may already have indexed it)
+        self.conn.execute(
+            """INSERT INTO page_texts(content_hash, text, title) VALUES (?, ?, ?)
+               ON CONFLICT(content_hash) DO UPDATE SET title = excluded.title
+               WHERE page_texts.title IS NULL AND excluded.title IS NOT NULL""",
+            (content_hash, text, title)
         )
         self.conn.commit()
 
+    def corpus_pending(self) -> List[int]:
+        """Ids of fetched pages whose current body isn't yet counted in corpus_terms."""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT p.id FROM pages p LEFT JOIN corpus_pages c ON c.url = p.url
+               WHERE p.html IS NOT NULL AND p.error IS NULL
+                 AND (p.content_hash IS NULL OR c.content_hash IS NOT p.content_hash)"""
+        )
+        return [r["id"] for r in cur.fetchall()]
+
+    def corpus_hash(self, url: str) -> Optional[str]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT content_hash FROM corpus_pages WHERE url=?", (url,))
+        row = cur.fetchone()
+        return row["content_hash"] if row else None
+
+    def apply_corpus_delta(self, url: str, content_hash: str, tf: Dict[str, int]) -> None:
+        """Add (or, with negative counts, subtract) one page's term counts in a single transaction."""
+        cur = self.conn.cursor()
+        cur.executemany(
+            """INSERT INTO corpus_terms(term, tf) VALUES (?, ?)
+               ON CONFLICT(term) DO UPDATE SET tf = tf + excluded.tf""",
+            list(tf.items())
+        )
+        # only this delta's shrinking terms can have dropped to zero (primary-key lookups, no scan)
+        cur.executemany(
+            "DELETE FROM corpus_terms WHERE term = ? AND tf <= 0",
+            [(t,) for t, n in tf.items() if n <= 0]
+        )
+        cur.execute(
+            "INSERT INTO corpus_pages(url, content_hash) VALUES (?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET content_hash = excluded.content_hash",
+            (url, content_hash)
+        )
+        self.conn.commit()
+
+    def corpus_term_freqs(self) -> Dict[str, int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT term, tf FROM corpus_terms")
+        return {r["term"]: r["tf"] for r in cur}
+
+    def corpus_signature(self) -> str:
+        cur = self.conn.cursor()
+        cur.execute("SELECT url, content_hash FROM corpus_pages ORDER BY url")
+        h = hashlib.sha256()
+        for r in cur:
+            h.update(f"{r['url']}\0{r['content_hash']}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def set_content_hash(self, page_id: int, content_hash: str, commit: bool = True) -> None:
+        self.conn.execute("UPDATE pages SET content_hash=? WHERE id=?", (content_hash, page_id))
+        if commit:
+            self.conn.commit()
+
     def stats(self) -> Dict[str, int]:
         cur = self.conn.cursor()
         cur.execute("SELECT COUNT(*) AS c FROM pages")
@@ -157,6 +447,263 @@ class DB:
         sums = cur.fetchone()["c"]
         return {"pages": pages, "items": items, "summaries": sums}
 
+    # --- recrawl schedule ---
+    def get_schedule(self, url: str) -> Optional[sqlite3.Row]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM url_schedule WHERE url=?", (url,))
+        return cur.fetchone()
+
+    def save_fetch(
+        self, url: str, status: int, content_hash: Optional[str], changed: bool, ts: str,
+        checks: int, changes: int, first_checked: str, change_rate: Optional[float], next_due: str,
+    ) -> None:
+        cur = self.conn.cursor()
+        cur.execute(
+            "INSERT INTO fetch_history(url, status, content_hash, changed, ts) VALUES (?, ?, ?, ?, ?)",
+            (url, status, content_hash, int(changed), ts)
+        )
+        cur.execute(
+            """INSERT INTO url_schedule(url, content_hash, checks, changes, first_checked,
+                   last_checked, last_changed, change_rate, next_due)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET content_hash = excluded.content_hash,
+                   checks = excluded.checks, changes = excluded.changes,
+                   last_checked = excluded.last_checked,
+                   last_changed = COALESCE(excluded.last_changed, last_changed),
+                   change_rate = excluded.change_rate, next_due = excluded.next_due""",
+            (url, content_hash, checks, changes, first_checked, ts, ts if changed else None,
+             change_rate, next_due)
+        )
+        self.conn.commit()
+
+    def backfill_schedule(self, min_interval_s: int) -> None:
+        """Seed url_schedule from pages fetched before the scheduler existed."""
+        self.conn.execute(
+            """INSERT OR IGNORE INTO url_schedule(url, content_hash, checks, changes,
+                   first_checked, last_checked, last_changed, change_rate, next_due)
+               SELECT url, content_hash, 1, 0, fetched_at, fetched_at, fetched_at, NULL,
+                      strftime('%Y-%m-%dT%H:%M:%SZ', fetched_at, ?)
+               FROM pages WHERE fetched_at IS NOT NULL""",
+            (f"+{int(min_interval_s)} seconds",)
+        )
+        self.conn.commit()
+
+    def iter_due_urls(self, now: str) -> Iterator[Tuple[str, Optional[int]]]:
+        """(url, depth) of due URLs, longest overdue first; depth is None if the page isn't stored here."""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT s.url, p.depth FROM url_schedule s LEFT JOIN pages p ON p.url = s.url
+               WHERE s.next_due <= ? ORDER BY s.next_due""",
+            (now,)
+        )
+        while True:
+            rows = cur.fetchmany(500)
+            if not rows:
+                return
+            for r in rows:
+                yield r["url"], r["depth"]
+
+    # --- near-duplicate / trap detection ---
+    def set_simhash(self, page_id: int, simhash: int) -> None:
+        self.conn.execute("UPDATE pages SET simhash=? WHERE id=?", (simhash, page_id))
+        self.conn.commit()
+
+    def load_url_patterns(self) -> List[sqlite3.Row]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM url_patterns")
+        return cur.fetchall()
+
+    def save_url_patterns(self, rows: Iterable[Tuple[str, int, int, int, int]]) -> None:
+        now = _now_iso()
+        self.conn.executemany(
+            """INSERT INTO url_patterns(template, pages, near_dups, query_variants, pruned, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(template) DO UPDATE SET pages = excluded.pages,
+                   near_dups = excluded.near_dups, query_variants = excluded.query_variants,
+                   pruned = excluded.pruned, updated_at = excluded.updated_at""",
+            [(*r, now) for r in rows]
+        )
+        self.conn.commit()
+
+    def load_url_pattern_combos(self) -> List[Tuple[str, str]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT path_template, combo FROM url_pattern_combos")
+        return [(r[0], r[1]) for r in cur.fetchall()]
+
+    def save_url_pattern_combos(self, rows: Iterable[Tuple[str, str]]) -> None:
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO url_pattern_combos(path_template, combo) VALUES (?, ?)", list(rows)
+        )
+        self.conn.commit()
+
+    # --- shards ---
+    def register_shard(self, job_id: int, path: str) -> None:
+        self.conn.execute(
+            "INSERT OR IGNORE INTO shards(job_id, path, status, created_at) VALUES (?, ?, 'active', ?)",
+            (job_id, path, _now_iso())
+        )
+        self.conn.commit()
+
+    def get_shard(self, job_id: int) -> Optional[sqlite3.Row]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM shards WHERE job_id=? AND status='active'", (job_id,))
+        return cur.fetchone()
+
+    def active_shards(self) -> List[sqlite3.Row]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM shards WHERE status='active' ORDER BY job_id DESC")
+        return cur.fetchall()
+
+    def mark_shard_merged(self, job_id: int) -> None:
+        self.conn.execute(
+            "UPDATE shards SET status='merged', merged_at=? WHERE job_id=?", (_now_iso(), job_id)
+        )
+        self.conn.commit()
+
+    # --- WARC offset index ---
+    def add_warc_record(
+        self, url: str, file: str, offset: int, length: int, status: Optional[int],
+        content_type: Optional[str], warc_date: str, commit: bool = True,
+    ) -> None:
+        self.conn.execute(
+            """INSERT INTO warc_records(url, file, offset, length, status, content_type, warc_date)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (url, file, offset, length, status, content_type, warc_date)
+        )
+        if commit:
+            self.conn.commit()
+
+    def get_warc_record(self, url: str) -> Optional[sqlite3.Row]:
+        # newest capture with a body wins (304s indexed from older archives are skipped)
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT * FROM warc_records WHERE url=? AND status IS NOT 304 ORDER BY id DESC LIMIT 1",
+            (url,)
+        )
+        return cur.fetchone()
+
+    def seed_crawl_state(self, path: str) -> None:
+        """
+        Copy another DB's recrawl schedule and trap statistics into this (new, empty) one, so a
+        shard starts from what earlier jobs learned. Stored pages are read via `prior` instead.
+        """
+        self.conn.commit()
+        self.conn.execute("ATTACH DATABASE ? AS c", (Path(path).resolve().as_uri() + "?mode=ro",))
+        try:
+            cur = self.conn.cursor()
+            cur.execute("INSERT OR IGNORE INTO url_schedule SELECT * FROM c.url_schedule")
+            cur.execute("INSERT OR IGNORE INTO url_patterns SELECT * FROM c.url_patterns")
+            cur.execute("INSERT OR IGNORE INTO url_pattern_combos SELECT * FROM c.url_pattern_combos")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.execute("DETACH DATABASE c")
+
+    def merge_shard_file(self, path: str) -> None:
+        """Copy one shard's crawl data into this DB, re-keying rows to this DB's page and item ids."""
+        self.conn.commit()
+        self.conn.execute("ATTACH DATABASE ? AS s", (path,))
+        try:
+            cur = self.conn.cursor()
+            cur.execute(
+                """INSERT INTO pages(url, domain, status, etag, last_modified, content_hash, html,
+                       error, fetched_at, depth, simhash)
+                   SELECT url, domain, status, etag, last_modified, content_hash, html,
+                       error, fetched_at, depth, simhash FROM s.pages WHERE true
+                   ON CONFLICT(url) DO UPDATE SET domain = excluded.domain, status = excluded.status,
+                       etag = excluded.etag, last_modified = excluded.last_modified,
+                       content_hash = excluded.content_hash, html = excluded.html,
+                       error = excluded.error, fetched_at = excluded.fetched_at,
+                       depth = excluded.depth, simhash = excluded.simhash
+                   WHERE excluded.fetched_at >= COALESCE(pages.fetched_at, '')"""
+            )
+            # shard item id -> (catalog item id, catalog page id); typed tables share the item ids
+            base = cur.execute("SELECT COALESCE(MAX(id), 0) FROM main.items").fetchone()[0]
+            cur.execute("DROP TABLE IF EXISTS temp.merge_items")
+            cur.execute(
+                """CREATE TEMP TABLE merge_items AS
+                   SELECT i.id AS shard_id, ? + row_number() OVER (ORDER BY i.id) AS id, m.id AS page_id
+                   FROM s.items i JOIN s.pages sp ON sp.id = i.page_id
+                   JOIN main.pages m ON m.url = sp.url""",
+                (base,)
+            )
+            cur.execute(
+                """INSERT INTO items(id, page_id, job_id, data_json, created_at, content_hash, config_hash)
+                   SELECT mi.id, mi.page_id, i.job_id, i.data_json, i.created_at, i.content_hash,
+                       i.config_hash
+                   FROM s.items i JOIN temp.merge_items mi ON mi.shard_id = i.id ORDER BY mi.id"""
+            )
+            self._merge_typed_items(cur)
+            cur.execute("DROP TABLE temp.merge_items")
+            cur.execute(
+                """INSERT INTO links(from_page_id, to_url)
+                   SELECT m.id, l.to_url FROM s.links l JOIN s.pages sp ON sp.id = l.from_page_id
+                   JOIN main.pages m ON m.url = sp.url"""
+            )
+            cur.execute(
+                """INSERT OR IGNORE INTO page_texts(content_hash, text, title)
+                   SELECT content_hash, text, title FROM s.page_texts"""
+            )
+            cur.execute(
+                """INSERT INTO warc_records(url, file, offset, length, status, content_type, warc_date)
+                   SELECT url, file, offset, length, status, content_type, warc_date
+                   FROM s.warc_records ORDER BY id"""
+            )
+            cur.execute(
+                """INSERT INTO fetch_history(url, status, content_hash, changed, ts)
+                   SELECT url, status, content_hash, changed, ts FROM s.fetch_history"""
+            )
+            cur.execute(
+                """INSERT INTO url_schedule SELECT * FROM s.url_schedule WHERE true
+                   ON CONFLICT(url) DO UPDATE SET content_hash = excluded.content_hash,
+                       checks = excluded.checks, changes = excluded.changes,
+                       last_checked = excluded.last_checked, last_changed = excluded.last_changed,
+                       change_rate = excluded.change_rate, next_due = excluded.next_due
+                   WHERE excluded.last_checked > url_schedule.last_checked"""
+            )
+            cur.execute(
+                """INSERT INTO url_patterns SELECT * FROM s.url_patterns WHERE true
+                   ON CONFLICT(template) DO UPDATE SET pages = excluded.pages,
+                       near_dups = excluded.near_dups, query_variants = excluded.query_variants,
+                       pruned = excluded.pruned, updated_at = excluded.updated_at
+                   WHERE excluded.updated_at > url_patterns.updated_at"""
+            )
+            cur.execute("INSERT OR IGNORE INTO url_pattern_combos SELECT * FROM s.url_pattern_combos")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.execute("DETACH DATABASE s")
+
+    def _merge_typed_items(self, cur: sqlite3.Cursor) -> None:
+        # typed items tables of the attached shard `s`: any non-built-in table laid out like
+        # ensure_typed_items makes them; created here (columns, indexes) when missing
+        cur.execute("SELECT name FROM s.sqlite_master WHERE type = 'table'")
+        for name in [r["name"] for r in cur.fetchall() if not is_reserved_table(r["name"])]:
+            cols = [(r["name"], r["type"]) for r in cur.execute(f'PRAGMA s.table_info("{name}")')]
+            if [c for c, _ in cols[:4]] != ["id", "page_id", "job_id", "created_at"]:
+                continue
+            cur.execute(
+                f'''CREATE TABLE IF NOT EXISTS main."{name}" (
+                     id INTEGER PRIMARY KEY, page_id INTEGER, job_id INTEGER, created_at TEXT)'''
+            )
+            self._ensure_columns(name, dict(cols[4:]))
+            cur.execute(f'PRAGMA s.index_list("{name}")')
+            for idx in [r["name"] for r in cur.fetchall() if r["origin"] == "c"]:
+                idx_cols = [r["name"] for r in cur.execute(f'PRAGMA s.index_info("{idx}")')]
+                col_sql = ", ".join(f'"{c}"' for c in idx_cols)
+                cur.execute(f'CREATE INDEX IF NOT EXISTS main."{idx}" ON "{name}"({col_sql})')
+            extra = [f'"{c}"' for c, _ in cols[4:]]
+            cur.execute(
+                f'''INSERT OR REPLACE INTO main."{name}"
+                      (id, page_id, job_id, created_at{"".join(", " + c for c in extra)})
+                    SELECT mi.id, mi.page_id, t.job_id, t.created_at{"".join(", t." + c for c in extra)}
+                    FROM s."{name}" t JOIN temp.merge_items mi ON mi.shard_id = t.id'''
+            )
+
     # --- jobs ---
     def create_job(self, config_json: str, depth: Optional[int], max_pages: Optional[int]) -> int:
         cur = self.conn.cursor()
@@ -170,11 +717,81 @@ class DB:
 
     def update_job_status(self, job_id: int, status: str):
         cur = self.conn.cursor()
+        now = _now_iso()
+        cur.execute(
+            """UPDATE jobs SET status=?, updated_at=?,
+                 started_at = CASE WHEN ? = 'running' THEN COALESCE(started_at, ?) ELSE started_at END,
+                 finished_at = CASE WHEN ? IN ('succeeded', 'failed', 'canceled') THEN ?
+                                    ELSE finished_at END
+               WHERE id=?""",
+            (status, now, status, now, status, now, job_id)
+        )
+        self.conn.commit()
+
+    def record_job_progress(
+        self, job_id: int, events: List[Tuple[str, Dict[str, Any]]],
+        pages: int = 0, items: int = 0, errors: int = 0, nbytes: int = 0,
+    ) -> None:
+        """Append buffered events and bump the job's counters in one transaction."""
+        cur = self.conn.cursor()
+        now = _now_iso()
+        cur.executemany(
+            "INSERT INTO job_events(job_id, type, payload, ts) VALUES (?, ?, ?, ?)",
+            [(job_id, t, json.dumps(p), now) for t, p in events]
+        )
+        cur.execute(
+            """UPDATE jobs SET pages_count = pages_count + ?, items_count = items_count + ?,
+                 errors_count = errors_count + ?, bytes_count = bytes_count + ?, updated_at = ?,
+                 pages_per_s = (pages_count + ?) / MAX(1.0, (julianday(?) - julianday(started_at)) * 86400)
+               WHERE id = ?""",
+            (pages, items, errors, nbytes, now, pages, now, job_id)
+        )
+        self.conn.commit()
+
+    def compact_job_events(self, older_than: str, types: Tuple[str, ...] = ("page", "items", "progress")) -> int:
+        """
+        Replace per-page/per-batch events older than `older_than` (ISO ts) of finished jobs
+        with one 'summary' event per job. Returns the number of events removed.
+        """
+        cur = self.conn.cursor()
+        marks = ",".join("?" * len(types))
         cur.execute(
-            "UPDATE jobs SET status=?, updated_at=? WHERE id=?",
-            (status, _now_iso(), job_id)
+            f"""SELECT e.job_id, COUNT(*) AS n, MIN(e.id) AS first_id,
+                       MIN(e.ts) AS first_ts, MAX(e.ts) AS last_ts,
+                       SUM(e.type = 'page') AS pages,
+                       SUM(e.type = 'page' AND json_extract(e.payload, '$.error') IS NOT NULL) AS errors,
+                       SUM(CASE WHEN e.type = 'items' THEN json_extract(e.payload, '$.count') END) AS items,
+                       -- progress events (reextract) carry running totals rather than deltas
+                       MAX(CASE WHEN e.type = 'progress' THEN json_extract(e.payload, '$.pages') END)
+                         AS progress_pages,
+                       MAX(CASE WHEN e.type = 'progress' THEN json_extract(e.payload, '$.items') END)
+                         AS progress_items
+                FROM job_events e JOIN jobs j ON j.id = e.job_id
+                WHERE e.ts < ? AND e.type IN ({marks})
+                  AND j.status IN ('succeeded', 'failed', 'canceled')
+                GROUP BY e.job_id""",
+            (older_than, *types)
         )
+        groups = cur.fetchall()
+        removed = 0
+        for g in groups:
+            cur.execute(
+                f"DELETE FROM job_events WHERE job_id = ? AND ts < ? AND type IN ({marks})",
+                (g["job_id"], older_than, *types)
+            )
+            removed += cur.rowcount
+            payload = {
+                "compacted": g["n"], "pages": max(g["pages"] or 0, g["progress_pages"] or 0),
+                "errors": g["errors"] or 0, "items": max(g["items"] or 0, g["progress_items"] or 0),
+                "first_ts": g["first_ts"], "last_ts": g["last_ts"],
+            }
+            # takes the first compacted event's id, so it stays ahead of the job's later events
+            cur.execute(
+                "INSERT INTO job_events(id, job_id, type, payload, ts) VALUES (?, ?, 'summary', ?, ?)",
+                (g["first_id"], g["job_id"], json.dumps(payload), g["last_ts"])
+            )
         self.conn.commit()
+        return removed
 
     def get_job(self, job_id: int) -> Optional[sqlite3.Row]:
         cur = self.conn.cursor()
@@ -210,12 +827,238 @@ class DB:
         return cur.fetchall()
 
     # override insert_items to accept job_id
-    def insert_items(self, page_id: int, items: List[Dict[str, Any]], job_id: Optional[int] = None) -> None:
+    def insert_items(
+        self, page_id: int, items: List[Dict[str, Any]], job_id: Optional[int] = None,
+        typed: Optional[TypedItemsTable] = None, content_hash: Optional[str] = None,
+        config_hash: Optional[str] = None, index: bool = False, commit: bool = True,
+    ) -> List[int]:
+        # index: also add the items to items_fts (the config's search_index)
         cur = self.conn.cursor()
-        rows = [(page_id, job_id, json.dumps(it), _now_iso()) for it in items]
+        now = _now_iso()
         cur.executemany(
-            "INSERT INTO items(page_id, job_id, data_json, created_at) VALUES (?, ?, ?, ?)",
-            rows
+            """INSERT INTO items(page_id, job_id, data_json, created_at, content_hash, config_hash)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(page_id, job_id, json.dumps(it), now, content_hash, config_hash) for it in items]
+        )
+        # rowids of one executemany on this connection are consecutive, ending at last_insert_rowid()
+        last = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+        ids = list(range(last - len(items) + 1, last + 1))
+        index = index and self.fts
+        if typed:
+            cur.executemany(
+                _typed_insert_sql(typed),
+                [typed.row(i, page_id, job_id, now, it) for i, it in zip(ids, items)]
+            )
+        if index:
+            cur.executemany(
+                "INSERT INTO items_fts(rowid, body) VALUES (?, ?)",
+                [(i, _item_text(it)) for i, it in zip(ids, items)]
+            )
+        if commit:
+            self.conn.commit()
+        return ids
+
+    def pages_for_extraction(
+        self, after_id: int, limit: int, skip_config_hash: Optional[str] = None
+    ) -> List[sqlite3.Row]:
+        """Next chunk of stored pages by id; optionally skip those already extracted with this config."""
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT p.id, p.html, p.content_hash FROM pages p
+               WHERE p.id > ? AND p.html IS NOT NULL AND p.error IS NULL
+                 AND (? IS NULL OR NOT (
+                   EXISTS (SELECT 1 FROM extractions e WHERE e.page_id = p.id AND e.config_hash = ?
+                             AND e.content_hash = p.content_hash)
+                   OR EXISTS (SELECT 1 FROM items i WHERE i.page_id = p.id AND i.config_hash = ?
+                                AND i.content_hash = p.content_hash)))
+               ORDER BY p.id LIMIT ?""",
+            (after_id, skip_config_hash, skip_config_hash, skip_config_hash, limit)
+        )
+        return cur.fetchall()
+
+    def record_extractions(
+        self, rows: Iterable[Tuple[int, str, Optional[str], int]], commit: bool = True
+    ) -> None:
+        # (page_id, config_hash, content_hash, items); pages that gave no items are recorded too
+        now = _now_iso()
+        self.conn.executemany(
+            """INSERT INTO extractions(page_id, config_hash, content_hash, items, extracted_at)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(page_id, config_hash) DO UPDATE SET content_hash = excluded.content_hash,
+                   items = excluded.items, extracted_at = excluded.extracted_at""",
+            [(*r, now) for r in rows]
+        )
+        if commit:
+            self.conn.commit()
+
+    # --- typed items tables ---
+    def ensure_typed_items(self, table: TypedItemsTable) -> None:
+        self.conn.execute(
+            f'''CREATE TABLE IF NOT EXISTS "{table.name}" (
+                 id INTEGER PRIMARY KEY, page_id INTEGER, job_id INTEGER, created_at TEXT)'''
+        )
+        self._ensure_columns(table.name, {c: t for c, t, *_ in table.columns})
+        for c in table.indexes:
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{table.name}_{c}" ON "{table.name}"("{c}")'
+            )
+        self.conn.commit()
+
+    def backfill_typed_items(
+        self, table: TypedItemsTable, job_id: Optional[int] = None, batch: int = 1000
+    ) -> int:
+        """Copy items stored before the typed table existed; returns rows added."""
+        cur = self.conn.cursor()
+        sql = _typed_insert_sql(table)
+        last_id, n = 0, 0
+        while True:
+            cur.execute(
+                f'''SELECT i.id, i.page_id, i.job_id, i.created_at, i.data_json FROM items i
+                    WHERE i.id > ? AND (? IS NULL OR i.job_id = ?)
+                      AND NOT EXISTS (SELECT 1 FROM "{table.name}" t WHERE t.id = i.id)
+                    ORDER BY i.id LIMIT ?''',
+                (last_id, job_id, job_id, batch)
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return n
+            cur.executemany(sql, [
+                table.row(r["id"], r["page_id"], r["job_id"], r["created_at"], json.loads(r["data_json"]))
+                for r in rows
+            ])
+            self.conn.commit()
+            last_id, n = rows[-1]["id"], n + len(rows)
+
+    # --- full-text search ---
+    def page_indexed_hash(self, page_id: int) -> Optional[str]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT content_hash FROM pages_fts_state WHERE page_id=?", (page_id,))
+        row = cur.fetchone()
+        return row["content_hash"] if row else None
+
+    def index_page(self, page_id: int, content_hash: str) -> None:
+        """Index a page with the title/text stored in page_texts for content_hash (put it there first)."""
+        cur = self.conn.cursor()
+        old_hash = self.page_indexed_hash(page_id)
+        if old_hash is not None:
+            # external content: removing a row takes exactly the values it was indexed with
+            cur.execute(
+                """INSERT INTO pages_fts(pages_fts, rowid, title, body)
+                   SELECT 'delete', ?, COALESCE(title, ''), text FROM page_texts WHERE content_hash=?""",
+                (page_id, old_hash)
+            )
+        cur.execute(
+            """INSERT INTO pages_fts(rowid, title, body)
+               SELECT ?, COALESCE(title, ''), text FROM page_texts WHERE content_hash=?""",
+            (page_id, content_hash)
+        )
+        cur.execute(
+            """INSERT INTO pages_fts_state(page_id, content_hash) VALUES (?, ?)
+               ON CONFLICT(page_id) DO UPDATE SET content_hash = excluded.content_hash""",
+            (page_id, content_hash)
+        )
+        self.conn.commit()
+
+    def unindexed_items(self, after_id: int = 0, limit: int = 1000) -> List[sqlite3.Row]:
+        # keyset walk by id; each item is a rowid lookup in items_fts, not a rescan of it
+        cur = self.conn.cursor()
+        cur.execute(
+            """SELECT i.id, i.data_json FROM items i LEFT JOIN items_fts f ON f.rowid = i.id
+               WHERE i.id > ? AND f.rowid IS NULL ORDER BY i.id LIMIT ?""",
+            (after_id, limit)
+        )
+        return cur.fetchall()
+
+    def index_items(self, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+        self.conn.executemany(
+            "INSERT INTO items_fts(rowid, body) VALUES (?, ?)",
+            [(i, _item_text(it)) for i, it in rows]
         )
         self.conn.commit()
 
+    def search(
+        self, query: str, kind: str = "all", limit: int = 20, marks: Tuple[str, str] = ("[", "]")
+    ) -> List[Dict[str, Any]]:
+        """
+        Ranked FTS5 search over page text and item fields. Plain-word queries that aren't
+        valid FTS5 syntax are retried with every term quoted.
+        """
+        try:
+            return self._search(query, kind, limit, marks)
+        except sqlite3.OperationalError:
+            quoted = " ".join('"' + t.replace('"', '""') + '"' for t in query.split())
+            return self._search(quoted, kind, limit, marks)
+
+    def _search(
+        self, query: str, kind: str, limit: int, marks: Tuple[str, str]
+    ) -> List[Dict[str, Any]]:
+        cur = self.conn.cursor()
+        out: List[Dict[str, Any]] = []
+        if kind in ("all", "pages"):
+            cur.execute(
+                """SELECT f.rowid AS id, p.url, f.title,
+                          snippet(pages_fts, 1, ?, ?, ' … ', 12) AS snippet,
+                          bm25(pages_fts, 5.0, 1.0) AS score
+                   FROM pages_fts f JOIN pages p ON p.id = f.rowid
+                   WHERE pages_fts MATCH ? ORDER BY score LIMIT ?""",
+                (*marks, query, limit)
+            )
+            out += [{"kind": "page", **dict(r)} for r in cur.fetchall()]
+        if kind in ("all", "items"):
+            cur.execute(
+                """SELECT f.rowid AS id, p.url, NULL AS title,
+                          snippet(items_fts, 0, ?, ?, ' … ', 12) AS snippet,
+                          bm25(items_fts) AS score
+                   FROM items_fts f JOIN items i ON i.id = f.rowid
+                   LEFT JOIN pages p ON p.id = i.page_id
+                   WHERE items_fts MATCH ? ORDER BY score LIMIT ?""",
+                (*marks, query, limit)
+            )
+            out += [{"kind": "item", **dict(r)} for r in cur.fetchall()]
+        # bm25() is lower-is-better
+        out.sort(key=lambda r: r["score"])
+        return out[:limit]
+
+
+class DBPool:
+    """
+    One writer connection plus a read-only WAL connection per thread, for the service:
+    crawls and job bookkeeping go through `writer`, request handlers read via `reader()`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # created first so the schema exists before any reader opens the file
+        self.writer = DB(path, check_same_thread=False)
+        self.writer.conn.execute("PRAGMA synchronous = NORMAL")
+        self._local = threading.local()
+        self._readers: List[DB] = []
+        self._lock = threading.Lock()
+
+    def reader(self) -> DB:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # check_same_thread off only so close() can run from the shutdown thread
+            db = DB(self.path, readonly=True, check_same_thread=False)
+            self._local.db = db
+            with self._lock:
+                self._readers.append(db)
+        return db
+
+    def close(self) -> None:
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for db in readers:
+            db.close()
+        self.writer.close()
+
+
+def _typed_insert_sql(table: TypedItemsTable) -> str:
+    cols = ["id", "page_id", "job_id", "created_at"] + [c for c, *_ in table.columns]
+    col_sql = ", ".join(f'"{c}"' for c in cols)
+    marks = ", ".join("?" * len(cols))
+    return f'INSERT OR REPLACE INTO "{table.name}"({col_sql}) VALUES ({marks})'
+
+
+def _item_text(item: Dict[str, Any]) -> str:
+    return "\n".join(str(v) for v in item.values() if v not in (None, ""))
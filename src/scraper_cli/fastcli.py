@@ -0,0 +1,90 @@
+from __future__ import annotations
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+# Console entry point. `stats` and `query` are answered here without importing typer or rich
+# (most of their startup time); anything else, or any option this parser doesn't know
+# (--help, --shards, ...), falls through to the Typer app in cli.py.
+
+
+def format_stats(stats: Dict[str, int]) -> str:
+    width = max((len(k) for k in stats), default=0)
+    return "\n".join(f"{k:<{width}}  {v:>10}" for k, v in stats.items())
+
+
+def format_rows(columns: Sequence[str], rows: Sequence[Sequence]) -> str:
+    # tab-separated with a header line; NULL prints as an empty field
+    lines = ["\t".join(columns)]
+    lines += ["\t".join("" if v is None else str(v) for v in r) for r in rows]
+    return "\n".join(lines)
+
+
+def _options(args: List[str], names: Sequence[str]) -> Optional[Dict[str, object]]:
+    # --name value / --name=value for the given options plus positionals; None if anything else
+    opts: Dict[str, object] = {"args": []}
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a.startswith("--"):
+            name, eq, value = a[2:].partition("=")
+            if name not in names:
+                return None
+            if not eq:
+                i += 1
+                if i >= len(args):
+                    return None
+                value = args[i]
+            opts[name] = value
+        elif a.startswith("-") and a != "-":
+            return None
+        else:
+            opts["args"].append(a)
+        i += 1
+    return opts
+
+
+def _open(db_path: str):
+    from .db import DB
+    path = Path(db_path)
+    return DB(path, readonly=True) if path.exists() else DB(path)
+
+
+def _fast(argv: List[str]) -> bool:
+    if not argv or argv[0] not in ("stats", "query"):
+        return False
+    if argv[0] == "stats":
+        opts = _options(argv[1:], ["db-path"])
+        if opts is None or opts["args"]:
+            return False
+        db = _open(opts.get("db-path", "scraper.db"))
+        try:
+            print(format_stats(db.stats()))
+        finally:
+            db.close()
+        return True
+    opts = _options(argv[1:], ["db-path", "limit"])
+    if opts is None or len(opts["args"]) != 1 or not str(opts.get("limit", "25")).isdigit():
+        return False
+    db = _open(opts.get("db-path", "scraper.db"))
+    try:
+        cur = db.conn.cursor()
+        cur.execute(opts["args"][0])
+        rows = cur.fetchmany(int(opts.get("limit", "25")))
+        if not rows:
+            print("No rows")
+        else:
+            print(format_rows(rows[0].keys(), rows))
+    finally:
+        db.close()
+    return True
+
+
+def main() -> None:
+    if not _fast(sys.argv[1:]):
+        from .cli import main as typer_main
+        typer_main()
+
+
+if __name__ == "__main__":
+    main()
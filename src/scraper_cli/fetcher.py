@@ -1,6 +1,8 @@
 from __future__ import annotations
 import asyncio
 import random
+import time
+from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple, Callable, Any
 from urllib.parse import urlparse
 import httpx
@@ -10,15 +12,26 @@ import urllib.robotparser as robotparser
 from .utils import domain_of, absolutize, compile_patterns, any_match, hash_text
 from .db import DB
 from .config import ScraperConfig
+from .parser import StreamingPage, extract_items
+from .scheduler import due_urls, record_fetch
+from .search import index_page
+from .sitemap import default_sitemap, iter_sitemap_urls
+from .throttle import RETRY_STATUSES, ThrottleRegistry, backoff_delay, parse_retry_after
+from .traps import DEMOTE, PRUNE, TrapDetector, page_fingerprint, to_sql_int
+from .typed_items import TypedItemsTable
+from .warc import ArchivingTransport, WarcWriter
 
 ProgressCb = Optional[Callable[[Dict[str, Any]], None]]
 
+# Transient network failures worth a retry; anything else (bad scheme, invalid URL, ...) fails at once
+RETRY_ERRORS = (httpx.TimeoutException, httpx.ConnectError, httpx.ReadError)
+
 
 class RobotsCache:
     def __init__(self):
         self._cache: Dict[str, robotparser.RobotFileParser] = {}
 
-    async def allowed(self, client: httpx.AsyncClient, url: str, user_agent: str) -> bool:
+    async def _load(self, client: httpx.AsyncClient, url: str) -> robotparser.RobotFileParser:
         netloc = domain_of(url)
         if netloc not in self._cache:
             rp = robotparser.RobotFileParser()
@@ -30,7 +43,13 @@ class RobotsCache:
                 # If robots cannot be fetched, be conservative and allow only if config disables respect_robots
                 rp.parse([])
             self._cache[netloc] = rp
-        return self._cache[netloc].can_fetch(user_agent, url)
+        return self._cache[netloc]
+
+    async def allowed(self, client: httpx.AsyncClient, url: str, user_agent: str) -> bool:
+        return (await self._load(client, url)).can_fetch(user_agent, url)
+
+    async def sitemaps(self, client: httpx.AsyncClient, url: str) -> List[str]:
+        return list((await self._load(client, url)).site_maps() or [])
 
 
 async def fetch_one(
@@ -40,8 +59,11 @@ async def fetch_one(
         url: str,
         depth: int,
         robots: RobotsCache,
+        throttles: ThrottleRegistry,
+        stream: Optional[StreamingPage] = None,
 ) -> Tuple[str, Optional[str], Optional[int], Optional[str], Optional[str], Optional[str]]:
     # Returns (url, html, status, etag, last_modified, error)
+    # With a StreamingPage, 2xx HTML bodies are fed to it chunk by chunk as they arrive
     headers = {"User-Agent": cfg.user_agent, **(cfg.headers or {})}
     # ETag / Last-Modified caching
     etag = None
@@ -60,27 +82,69 @@ async def fetch_one(
         if not allowed:
             return (url, None, 999, None, None, "Blocked by robots.txt")
 
-    try:
-        r = await client.get(url, headers=req_headers, timeout=httpx.Timeout(10.0, read=20.0), follow_redirects=True)
-        status = r.status_code
-        etag = r.headers.get("ETag")
-        last_modified = r.headers.get("Last-Modified")
-        html = None
-        if status == 304 and prior and prior["html"]:
-            html = prior["html"]
-        elif 200 <= status < 300:
-            # basic content-type check
-            ct = r.headers.get("Content-Type", "")
-            if "text/html" in ct or "application/xhtml+xml" in ct or ct == "":
-                html = r.text
-        return (url, html, status, etag, last_modified, None)
-    except Exception as ex:
-        return (url, None, None, None, None, repr(ex))
-
-
-def extract_links(base_url: str, html: str) -> List[str]:
+    host = domain_of(url)
+    attempt = 0
+    while True:
+        retry_after = None
+        async with throttles.slot(host) as lim:
+            started = time.monotonic()
+            try:
+                if stream is None:
+                    r = await client.get(url, headers=req_headers, timeout=httpx.Timeout(10.0, read=20.0),
+                                         follow_redirects=True)
+                else:
+                    r = await _get_streamed(client, url, req_headers, stream)
+            except RETRY_ERRORS as ex:
+                lim.on_throttle()
+                if attempt >= cfg.max_retries:
+                    return (url, None, None, None, None, repr(ex))
+            except Exception as ex:
+                return (url, None, None, None, None, repr(ex))
+            else:
+                status = r.status_code
+                if status in RETRY_STATUSES:
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                    lim.on_throttle(retry_after)
+                else:
+                    lim.on_success(time.monotonic() - started)
+                if status not in RETRY_STATUSES or attempt >= cfg.max_retries:
+                    break
+        await asyncio.sleep(backoff_delay(attempt, cfg.backoff_base_ms, cfg.backoff_max_ms, retry_after))
+        attempt += 1
+
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    html = None
+    if status == 304 and prior and prior["html"]:
+        html = prior["html"]
+    elif 200 <= status < 300:
+        # basic content-type check
+        if _is_html(r.headers.get("Content-Type", "")):
+            html = stream.text if stream is not None else r.text
+    return (url, html, status, etag, last_modified, None)
+
+
+def _is_html(content_type: str) -> bool:
+    return "text/html" in content_type or "application/xhtml+xml" in content_type or content_type == ""
+
+
+async def _get_streamed(client: httpx.AsyncClient, url: str, headers: Dict[str, str],
+                        stream: StreamingPage) -> httpx.Response:
+    stream.reset()
+    async with client.stream("GET", url, headers=headers, timeout=httpx.Timeout(10.0, read=20.0),
+                             follow_redirects=True) as r:
+        if 200 <= r.status_code < 300 and _is_html(r.headers.get("Content-Type", "")):
+            async for chunk in r.aiter_text():
+                stream.feed(chunk)
+        else:
+            await r.aread()
+    return r
+
+
+def extract_links(base_url: str, html: str, soup: Optional[BeautifulSoup] = None) -> List[str]:
     # soup = BeautifulSoup(html, "lxml") if "lxml" in BeautifulSoup.builder_registry.builders else BeautifulSoup(html, "html.parser")
-    soup = BeautifulSoup(html, 'html.parser')
+    if soup is None:
+        soup = BeautifulSoup(html, 'html.parser')
     out = []
     for a in soup.find_all("a", href=True):
         out.append(absolutize(base_url, a["href"]))
@@ -111,15 +175,40 @@ def extract_domain_filtered(
 
 
 async def crawl(cfg: ScraperConfig, db: DB, max_pages: Optional[int] = None, job_id: Optional[int] = None,
-                on_event: ProgressCb = None):
+                on_event: ProgressCb = None, recrawl: bool = False,
+                transport: Optional[httpx.AsyncBaseTransport] = None):
+    # transport: e.g. warc.WarcReplayTransport to crawl an archive instead of the network
     visited: Set[str] = set()
     to_visit: List[Tuple[str, int]] = [(s, 0) for s in cfg.seeds]
+    if recrawl:
+        # Only URLs that are due, plus seeds never fetched; the budget caps the run
+        max_pages = max_pages or cfg.recrawl_budget
+        to_visit = [(s, 0) for s in cfg.seeds if db.get_page(s) is None]
+        to_visit += due_urls(db, cfg, max_pages)
     robots = RobotsCache()
     allow_pat = compile_patterns(cfg.link_filters.allow_regex)
     deny_pat = compile_patterns(cfg.link_filters.deny_regex)
 
-    limits = httpx.Limits(max_keepalive_connections=cfg.concurrency, max_connections=cfg.concurrency)
-    async with httpx.AsyncClient(limits=limits, http2=True) as client:
+    throttles = ThrottleRegistry(cfg)
+    typed = TypedItemsTable.from_config(cfg)
+    traps = TrapDetector(cfg, db) if cfg.trap_detection else None
+    config_hash = cfg.extract_hash()
+    deferred: List[Tuple[str, int]] = []  # demoted by trap detection; fetched when nothing else is queued
+    frontier_grew = asyncio.Event()  # set when a worker queues links (possibly mid-download)
+    if typed:
+        db.ensure_typed_items(typed)
+    # Upper bound on in-flight workers; per-host limiters decide how many actually hit the wire
+    n_workers = max(cfg.concurrency, cfg.max_concurrency) if cfg.adaptive_concurrency else cfg.concurrency
+    launched = 0
+
+    limits = httpx.Limits(max_keepalive_connections=n_workers, max_connections=n_workers)
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(http2=True, limits=limits)
+    if cfg.warc_dir:
+        transport = ArchivingTransport(
+            transport, WarcWriter(db, Path(cfg.warc_dir), cfg.warc_max_bytes, prefix=cfg.name)
+        )
+    async with httpx.AsyncClient(transport=transport) as client:
         with Progress(
                 SpinnerColumn(),
                 TextColumn("[bold]Crawling[/bold]"),
@@ -130,65 +219,166 @@ async def crawl(cfg: ScraperConfig, db: DB, max_pages: Optional[int] = None, job
         ) as progress:
             all_links = {item[0] for item in to_visit}
             task = progress.add_task("crawl", total=len(all_links))
-            sem = asyncio.Semaphore(cfg.concurrency)
+
+            async def discover_sitemaps():
+                # Stream sitemap entries straight into the frontier while workers run
+                headers = {"User-Agent": cfg.user_agent, **(cfg.headers or {})}
+                for seed in cfg.seeds:
+                    sitemaps = await robots.sitemaps(client, seed) or [default_sitemap(seed)]
+                    base_domain = domain_of(seed)
+                    async for loc, lastmod in iter_sitemap_urls(client, sitemaps, headers, cfg.max_sitemaps):
+                        if max_pages and launched + len(to_visit) >= max_pages:
+                            return
+                        if loc in all_links or not extract_domain_filtered(
+                            [loc], base_domain, cfg.follow_same_domain_only,
+                            cfg.allowed_domains, allow_pat, deny_pat
+                        ):
+                            continue
+                        if lastmod:
+                            prior = db.get_page(loc)
+                            if prior and not prior["error"] and (prior["fetched_at"] or "") >= lastmod:
+                                continue  # unchanged since we last fetched it
+                        all_links.add(loc)
+                        to_visit.append((loc, 0))
+                        progress.update(task, total=len(all_links))
+
+            def queue_links(links: List[str], depth: int):
+                for ln in links:
+                    if recrawl and db.get_page(ln) is not None:
+                        continue  # known page: the schedule decides when it is due
+                    if traps and traps.verdict(ln) == PRUNE:
+                        continue
+                    if (not max_pages) or (launched + len(to_visit) < max_pages):
+                        to_visit.append((ln, depth + 1))
+
+                all_links.update(links)
+                progress.update(task, total=len(all_links))  # Update the total number of items in progress
+                frontier_grew.set()
 
             async def worker(url: str, depth: int):
-                nonlocal visited
-                nonlocal all_links
-                if max_pages and progress.tasks[0].completed >= max_pages:
-                    return
-                if url in visited:
-                    return
-                visited.add(url)
                 base_domain = domain_of(url)
-                await asyncio.sleep(random.uniform(cfg.delay_ms_min, cfg.delay_ms_max) / 1000.0)
-                async with sem:
-                    (u, html, status, etag, last_modified, error) = await fetch_one(
-                        client, db, cfg, url, depth, robots
-                    )
-                content_hash = None
+                if not cfg.adaptive_concurrency:
+                    await asyncio.sleep(random.uniform(cfg.delay_ms_min, cfg.delay_ms_max) / 1000.0)
+                stream = None
+                streamed_links: List[str] = []
+                if cfg.stream_parse:
+                    def on_href(href: str):
+                        links = extract_domain_filtered(
+                            [absolutize(url, href)], base_domain, cfg.follow_same_domain_only,
+                            cfg.allowed_domains, allow_pat, deny_pat
+                        )
+                        if links:
+                            streamed_links.extend(links)
+                            queue_links(links, depth)
+
+                    # fetch_one resets the stream per attempt; a retry must not repeat links
+                    stream = StreamingPage(on_href if depth < cfg.max_depth else None,
+                                           on_reset=streamed_links.clear)
+                (u, html, status, etag, last_modified, error) = await fetch_one(
+                    client, db, cfg, url, depth, robots, throttles, stream
+                )
+                # 2xx HTML bodies came through the stream; a 304 reuses the stored html and is reparsed
+                soup = stream.close() if stream is not None and html and 200 <= status < 300 else None
+                streamed = soup is not None
+                if html and soup is None and (cfg.search_index or traps or cfg.extract or depth < cfg.max_depth):
+                    # parsed once; links, items, search text and the trap fingerprint share the tree
+                    soup = BeautifulSoup(html, 'html.parser')
+                content_hash = hash_text(html) if html else None
                 page_id = db.upsert_page(
                     url=u, domain=base_domain, status=status, html=html,
                     etag=etag, last_modified=last_modified, error=error,
                     depth=depth, content_hash=content_hash
                 )
+                record_fetch(db, cfg, u, status, content_hash)
+                if html and cfg.search_index:
+                    index_page(db, page_id, html, content_hash, soup=soup)
+                near_dup = None
+                if html and traps:
+                    fp = page_fingerprint(db, html, content_hash, soup=soup)
+                    db.set_simhash(page_id, to_sql_int(fp))
+                    near_dup = traps.observe(u, fp)
                 progress.update(task, advance=1)
                 if on_event:
-                    on_event({
+                    ev = {
                         "type": "page",
                         "url": u,
                         "status": status,
                         "error": error,
-                        "depth": depth
-                    })
+                        "depth": depth,
+                        "bytes": len(html) if html else 0,
+                    }
+                    if near_dup is not None:
+                        ev["near_dup"] = near_dup
+                    on_event(ev)
                 # Extract links and queue
                 if html and depth < cfg.max_depth:
-                    links = extract_links(u, html)
-                    links = extract_domain_filtered(
-                        links, base_domain, cfg.follow_same_domain_only,
-                        cfg.allowed_domains, allow_pat, deny_pat
-                    )
+                    if streamed:
+                        links = streamed_links  # already queued while the body downloaded
+                    else:
+                        links = extract_domain_filtered(
+                            extract_links(u, html, soup), base_domain, cfg.follow_same_domain_only,
+                            cfg.allowed_domains, allow_pat, deny_pat
+                        )
+                        queue_links(links, depth)
                     db.insert_links(page_id, links)
-                    for ln in links:
-                        if (not max_pages) or (progress.tasks[0].completed + len(to_visit) < max_pages):
-                            to_visit.append((ln, depth + 1))
-
-                    all_links.update(links)
-                    progress.update(task, total=len(all_links))  # Update the total number of items in progress
 
                 # Extract items per config now (page-time parsing)
                 if html and cfg.extract:
-                    from .parser import extract_items
-                    items = extract_items(html, cfg)
+                    items = extract_items(html, cfg, soup=soup)
                     if items:
-                        db.insert_items(page_id, items, job_id=job_id)
+                        db.insert_items(
+                            page_id, items, job_id=job_id, typed=typed,
+                            content_hash=content_hash, config_hash=config_hash, index=cfg.search_index,
+                        )
                         if on_event:
                             on_event({"type": "items", "count": len(items)})
 
-            while to_visit and (not max_pages or progress.tasks[0].completed < max_pages):
-                url, depth = to_visit.pop(0)
+            async def run(url: str, depth: int):
                 try:
                     await worker(url, depth)
                 except Exception as ex:
                     # best-effort continuity
                     db.upsert_page(url=url, domain=domain_of(url), error=repr(ex), depth=depth)
+
+            pending: Set[asyncio.Task] = set()
+            discovery = asyncio.create_task(discover_sitemaps()) if cfg.use_sitemaps else None
+            while to_visit or deferred or pending or (discovery and not discovery.done()):
+                while (to_visit or deferred) and len(pending) < n_workers and (not max_pages or launched < max_pages):
+                    demoted = not to_visit
+                    url, depth = to_visit.pop(0) if to_visit else deferred.pop(0)
+                    if url in visited:
+                        continue
+                    if traps:
+                        # re-check at dequeue time: the template's stats may have changed since
+                        verdict = traps.verdict(url)
+                        if verdict == PRUNE:
+                            visited.add(url)
+                            continue
+                        if verdict == DEMOTE and not demoted:
+                            deferred.append((url, depth))
+                            continue
+                    visited.add(url)
+                    launched += 1
+                    pending.add(asyncio.create_task(run(url, depth)))
+                if discovery and not discovery.done():
+                    # poll so newly discovered URLs get workers as soon as slots are free
+                    _, pending = await asyncio.wait(
+                        pending | {discovery}, timeout=0.05, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    pending.discard(discovery)
+                    continue
+                if not pending:
+                    break
+                if cfg.stream_parse and len(pending) < n_workers:
+                    # links queued mid-download can take free slots before any page finishes
+                    frontier_grew.clear()
+                    grew = asyncio.create_task(frontier_grew.wait())
+                    _, pending = await asyncio.wait(pending | {grew}, return_when=asyncio.FIRST_COMPLETED)
+                    pending.discard(grew)
+                    grew.cancel()
+                    continue
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if discovery:
+                discovery.result()
+            if traps:
+                traps.save()
@@ -1,6 +1,8 @@
 from __future__ import annotations
-from typing import Any, Dict, List
-from bs4 import BeautifulSoup
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup, CData, NavigableString
+# Private bs4 module: StreamingPage drives its parser directly (pyproject pins bs4 to tested releases)
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
 from .config import ScraperConfig
 
 def _get_text(el) -> str:
@@ -11,10 +13,11 @@ def _get_attr(el, attr: str) -> str:
         return ""
     return (el.get(attr) or "").strip()
 
-def extract_items(html: str, cfg: ScraperConfig) -> List[Dict[str, Any]]:
+def extract_items(html: str, cfg: ScraperConfig, soup: Optional[BeautifulSoup] = None) -> List[Dict[str, Any]]:
     # If item_selector provided → multi-item page; else single item/page
     # soup = BeautifulSoup(html, "lxml") if "lxml" in BeautifulSoup.builder_registry.builders else BeautifulSoup(html, "html.parser")
-    soup = BeautifulSoup(html, 'html.parser')
+    if soup is None:
+        soup = BeautifulSoup(html, 'html.parser')
 
     if cfg.item_selector:
         items = []
@@ -42,3 +45,106 @@ def extract_items(html: str, cfg: ScraperConfig) -> List[Dict[str, Any]]:
         else:
             row[rule.name] = ""
     return [row] if row else []
+
+class _LinkSpyParser(BeautifulSoupHTMLParser):
+    """html.parser tree builder that also reports every <a href> as soon as its start tag is seen."""
+    on_href: Optional[Callable[[str], None]] = None
+
+    def handle_starttag(self, tag, attrs, *args, **kwargs):
+        super().handle_starttag(tag, attrs, *args, **kwargs)
+        if tag == "a" and self.on_href:
+            href = None
+            for key, value in attrs:
+                if key == "href":
+                    href = value or ""  # last one wins, as in the tree
+            if href is not None:
+                self.on_href(href)
+
+
+class StreamingPage:
+    """
+    Builds the same BeautifulSoup tree as BeautifulSoup(html, "html.parser"), but from text
+    chunks fed while the body downloads; on_href fires for each link as soon as it is parsed.
+    If the parser rejects the markup, feeding stops and close() returns None (callers reparse).
+    Relies on bs4 internals (the html.parser builder and BeautifulSoup._feed's finishing steps).
+    """
+
+    def __init__(self, on_href: Optional[Callable[[str], None]] = None,
+                 on_reset: Optional[Callable[[], None]] = None):
+        self.on_href = on_href
+        # lets callers drop what on_href collected from an abandoned attempt
+        self.on_reset = on_reset
+        self.reset()
+
+    def reset(self) -> None:
+        # a retried request starts over with an empty tree
+        if self.on_reset:
+            self.on_reset()
+        self.chunks: List[str] = []
+        self.failed = False
+        self._soup: Optional[BeautifulSoup] = BeautifulSoup("", "html.parser")
+        self._soup.reset()
+        args, kwargs = self._soup.builder.parser_args
+        self._parser = _LinkSpyParser(self._soup, *args, **kwargs)
+        self._parser.on_href = self.on_href
+        self._closed = False
+
+    @property
+    def text(self) -> str:
+        # joined once and kept as the only chunk, so the body is not held twice
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+    def feed(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        if self.failed:
+            return
+        try:
+            self._parser.feed(chunk)
+        except AssertionError:
+            self.failed = True
+
+    def close(self) -> Optional[BeautifulSoup]:
+        # the raw text has been read by now; drop the chunks so only the tree stays alive
+        self.chunks = []
+        if self.failed:
+            self._soup = self._parser = None
+            return None
+        if not self._closed:
+            self._closed = True
+            soup = self._soup
+            try:
+                self._parser.close()
+            except AssertionError:
+                self.failed = True
+                return None
+            self._parser.already_closed_empty_element = []
+            # same finishing steps as BeautifulSoup._feed
+            soup.endData()
+            while soup.currentTag is not None and soup.currentTag.name != soup.ROOT_TAG_NAME:
+                soup.popTag()
+        return self._soup
+
+
+_INVISIBLE = ["script", "style", "noscript", "template", "head", "svg"]
+
+def visible_text(html: str, soup: Optional[BeautifulSoup] = None) -> str:
+    return title_and_text(html, soup)[1]
+
+def title_and_text(html: str, soup: Optional[BeautifulSoup] = None) -> Tuple[str, str]:
+    # One text block per line so headings/list items don't run into the next sentence.
+    # Read-only walk (same result as decomposing _INVISIBLE + get_text), so a soup shared
+    # with link/item extraction can be passed in.
+    if soup is None:
+        soup = BeautifulSoup(html, 'html.parser')
+    title = _get_text(soup.title)
+    parts = []
+    for s in soup.descendants:
+        # get_text's string types: skips comments, doctypes and script/style strings
+        if type(s) not in (NavigableString, CData) or s.find_parent(_INVISIBLE):
+            continue
+        s = s.strip()
+        if s:
+            parts.append(s)
+    return title, "\n".join(parts)
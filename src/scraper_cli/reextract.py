@@ -0,0 +1,95 @@
+from __future__ import annotations
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import ScraperConfig
+from .db import DB
+from .typed_items import TypedItemsTable
+from .utils import hash_text
+
+ProgressCb = Optional[Callable[[Dict[str, Any]], None]]
+
+# Set once per worker process by _init_worker
+_worker_cfg: Optional[ScraperConfig] = None
+
+
+def _init_worker(config_json: str) -> None:
+    global _worker_cfg
+    _worker_cfg = ScraperConfig.load_json_str(config_json)
+
+
+def _extract_chunk(pages: List[Tuple[int, str]]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    from .parser import extract_items
+    return [(page_id, extract_items(html, _worker_cfg)) for page_id, html in pages]
+
+
+async def reextract(
+    cfg: ScraperConfig,
+    db: DB,
+    job_id: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 200,
+    only_new: bool = True,
+    on_event: ProgressCb = None,
+) -> Dict[str, int]:
+    """
+    Run the config's extract rules over stored pages, no network involved. Pages are read
+    in id-ordered chunks, parsed in a process pool, and each chunk's items are written
+    in one transaction. Every page is recorded in extractions, so with only_new pages
+    already run through the same extract config at the same content hash are skipped,
+    including those that gave no items. Pages stored without a content hash get one first.
+    """
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    config_hash = cfg.extract_hash()
+    typed = TypedItemsTable.from_config(cfg)
+    if typed:
+        db.ensure_typed_items(typed)
+    hashes: Dict[int, Optional[str]] = {}
+    stats = {"pages": 0, "items": 0}
+
+    def write(results: List[Tuple[int, List[Dict[str, Any]]]]) -> None:
+        n_items = 0
+        done = []
+        for page_id, items in results:
+            content_hash = hashes.pop(page_id, None)
+            if items:
+                db.insert_items(
+                    page_id, items, job_id=job_id, typed=typed,
+                    content_hash=content_hash, config_hash=config_hash,
+                    index=cfg.search_index, commit=False,
+                )
+                n_items += len(items)
+            done.append((page_id, config_hash, content_hash, len(items)))
+        db.record_extractions(done, commit=False)
+        db.conn.commit()
+        stats["pages"] += len(results)
+        stats["items"] += n_items
+        if on_event:
+            on_event({"type": "progress", "pages": stats["pages"], "items": stats["items"]})
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cfg.dump(),)) as pool:
+        in_flight: List[asyncio.Future] = []
+        last_id = 0
+        while True:
+            rows = db.pages_for_extraction(last_id, chunk_size, config_hash if only_new else None)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            for r in rows:
+                content_hash = r["content_hash"]
+                if not content_hash:
+                    # pages stored before content hashes: backfill so the only_new check can match
+                    content_hash = hash_text(r["html"])
+                    db.set_content_hash(r["id"], content_hash, commit=False)
+                hashes[r["id"]] = content_hash
+            chunk = [(r["id"], r["html"]) for r in rows]
+            in_flight.append(loop.run_in_executor(pool, _extract_chunk, chunk))
+            # bounded read-ahead: at most two chunks per worker held in memory
+            if len(in_flight) >= workers * 2:
+                write(await in_flight.pop(0))
+        for fut in in_flight:
+            write(await fut)
+    return stats
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from .config import ScraperConfig
+from .db import DB, _now_iso
+from .utils import any_match, compile_patterns, domain_of
+
+ISO_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_iso(ts: str) -> datetime:
+    return datetime.strptime(ts, ISO_FMT)
+
+
+def to_iso(dt: datetime) -> str:
+    return dt.strftime(ISO_FMT)
+
+
+def estimate_change_rate(checks: int, changes: int, span_s: float) -> Optional[float]:
+    """
+    Changes per second from periodic checks (Cho & Garcia-Molina's estimator), which
+    corrects for changes hidden between two checks: -ln((n - X + 0.5) / (n + 0.5)) / I
+    with n intervals observed, X of them changed, and mean interval I.
+    """
+    n = checks - 1
+    if n <= 0 or span_s <= 0:
+        return None
+    mean_interval = span_s / n
+    return -math.log((n - changes + 0.5) / (n + 0.5)) / mean_interval
+
+
+def next_interval(rate: Optional[float], span_s: float, min_s: int, max_s: int) -> float:
+    """
+    Seconds until a page is due again: its expected time-to-change, clamped. Pages never
+    seen changing back off geometrically (twice the observed span) instead of jumping to max.
+    """
+    if rate is None:
+        expected = min_s
+    elif rate <= 0:
+        expected = 2 * span_s
+    else:
+        expected = 1.0 / rate
+    return float(min(max_s, max(min_s, expected)))
+
+
+def record_fetch(
+    db: DB, cfg: ScraperConfig, url: str, status: Optional[int], content_hash: Optional[str]
+) -> None:
+    """Append to fetch_history and refresh the URL's change-rate estimate and next due time."""
+    if status is None or not (200 <= status < 300 or status == 304):
+        return  # failed fetches tell us nothing about change frequency
+    now = _now_iso()
+    prev = db.get_schedule(url)
+    if prev is None:
+        checks, changes, first = 1, 0, now
+        changed = True
+    else:
+        changed = status != 304 and content_hash is not None and content_hash != prev["content_hash"]
+        checks, changes = prev["checks"] + 1, prev["changes"] + int(changed)
+        first = prev["first_checked"]
+        if status == 304 or content_hash is None:
+            content_hash = prev["content_hash"]
+    span = (parse_iso(now) - parse_iso(first)).total_seconds()
+    rate = estimate_change_rate(checks, changes, span)
+    due = parse_iso(now) + timedelta(
+        seconds=next_interval(rate, span, cfg.recrawl_min_interval_s, cfg.recrawl_max_interval_s)
+    )
+    db.save_fetch(
+        url=url, status=status, content_hash=content_hash, changed=changed, ts=now,
+        checks=checks, changes=changes, first_checked=first, change_rate=rate, next_due=to_iso(due),
+    )
+
+
+def crawl_domains(cfg: ScraperConfig) -> Optional[List[str]]:
+    """Domains a crawl with this config can reach, or None when it may follow links anywhere."""
+    domains = None
+    if cfg.follow_same_domain_only:
+        domains = {domain_of(s) for s in cfg.seeds}
+    if cfg.allowed_domains:
+        domains = set(cfg.allowed_domains) if domains is None else domains & set(cfg.allowed_domains)
+    return sorted(domains) if domains is not None else None
+
+
+def due_urls(db: DB, cfg: ScraperConfig, budget: int) -> List[Tuple[str, int]]:
+    """
+    (url, depth) pairs whose next recrawl is due, longest overdue first. The schedule covers
+    every page in the DB, so only URLs this config's domains and link filters admit are taken.
+    Domains come from the URL itself: a shard has the catalog's schedule but not its pages.
+    """
+    db.backfill_schedule(cfg.recrawl_min_interval_s)
+    domains = crawl_domains(cfg)
+    domains = set(domains) if domains is not None else None
+    allow = compile_patterns(cfg.link_filters.allow_regex)
+    deny = compile_patterns(cfg.link_filters.deny_regex)
+    out: List[Tuple[str, int]] = []
+    for url, depth in db.iter_due_urls(_now_iso()):
+        if domains is not None and domain_of(url) not in domains:
+            continue
+        if deny and any_match(deny, url):
+            continue
+        if allow and not any_match(allow, url):
+            continue
+        if depth is None:
+            # not stored in this DB (e.g. a shard): the catalog copy via get_page, else a seed
+            page = db.get_page(url)
+            depth = page["depth"] if page is not None and page["depth"] is not None else 0
+        out.append((url, depth))
+        if len(out) >= budget:
+            break
+    return out
@@ -0,0 +1,57 @@
+from __future__ import annotations
+import json
+from typing import Optional
+from .db import DB
+from .utils import hash_text
+
+
+def index_page(db: DB, page_id: int, html: str, content_hash: Optional[str] = None, soup=None) -> bool:
+    """(Re)index one page body in pages_fts; skipped when the indexed hash is current."""
+    if not db.fts:
+        return False
+    content_hash = content_hash or hash_text(html)
+    if db.page_indexed_hash(page_id) == content_hash:
+        return False
+    if db.get_page_title(content_hash) is None:
+        # text/title not cached yet for this body (soup: an already parsed tree of html)
+        from .parser import title_and_text
+        title, text = title_and_text(html, soup)
+        # shared with the summarizer and trap detection; pages_fts indexes it from there
+        db.put_page_text(content_hash, text, title)
+    db.index_page(page_id, content_hash)
+    return True
+
+
+def reindex(db: DB, batch: int = 200) -> int:
+    """Backfill the index for pages/items stored before it existed (or before a body changed)."""
+    if not db.fts:
+        return 0
+    n = 0
+    cur = db.conn.cursor()
+    cur.execute(
+        """SELECT p.id FROM pages p LEFT JOIN pages_fts_state f ON f.page_id = p.id
+           WHERE p.html IS NOT NULL AND p.error IS NULL
+             AND (p.content_hash IS NULL OR f.content_hash IS NOT p.content_hash)"""
+    )
+    ids = [r["id"] for r in cur.fetchall()]
+    for i in range(0, len(ids), batch):
+        chunk = ids[i:i + batch]
+        cur.execute(
+            f"SELECT id, html, content_hash FROM pages WHERE id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for row in cur.fetchall():
+            content_hash = row["content_hash"]
+            if not content_hash:
+                content_hash = hash_text(row["html"])
+                db.set_content_hash(row["id"], content_hash)
+            n += index_page(db, row["id"], row["html"], content_hash)
+    last_id = 0
+    while True:
+        rows = db.unindexed_items(last_id, batch)
+        if not rows:
+            break
+        db.index_items((r["id"], json.loads(r["data_json"])) for r in rows)
+        n += len(rows)
+        last_id = rows[-1]["id"]
+    return n
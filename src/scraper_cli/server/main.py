@@ -1,16 +1,20 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from .models import CreateJobRequest, JobDTO, EventDTO, ItemRow
-from ..db import DB
+from .models import CreateJobRequest, ReextractRequest, JobDTO, EventDTO, ItemRow, SearchHit
+from ..db import DB, DBPool
+from ..shards import open_view
 from ..config import ScraperConfig
 from .ws import WSManager
 from .runner import JobRunner
 from pathlib import Path
 import asyncio
 import json
+import os
 from typing import List
 
 DB_PATH = Path("scraper.db")
+# Optional per-job shard files; DB_PATH then acts as the catalog
+SHARD_DIR = Path(os.environ["SCRAPER_SHARD_DIR"]) if os.environ.get("SCRAPER_SHARD_DIR") else None
 
 app = FastAPI(title="Scraper Service", version="0.1")
 app.add_middleware(
@@ -22,12 +26,24 @@ app.add_middleware(
 )
 
 ws_manager = WSManager()
-db = DB(DB_PATH)
-runner = JobRunner(db, ws_manager)
+pool = DBPool(DB_PATH)
+# single writer: job creation, crawl writes and events; handlers below read via pool.reader()
+db = pool.writer
+runner = JobRunner(db, ws_manager, shard_dir=SHARD_DIR)
+
+def _job_dto(r) -> JobDTO:
+    return JobDTO(
+        id=r["id"], status=r["status"], created_at=r["created_at"],
+        updated_at=r["updated_at"], depth=r["depth"], max_pages=r["max_pages"],
+        started_at=r["started_at"], finished_at=r["finished_at"],
+        pages=r["pages_count"] or 0, items=r["items_count"] or 0,
+        errors=r["errors_count"] or 0, bytes=r["bytes_count"] or 0,
+        pages_per_s=r["pages_per_s"],
+    )
 
 @app.on_event("shutdown")
 def _shutdown():
-    db.close()
+    pool.close()
 
 @app.get("/health")
 def health():
@@ -41,30 +57,28 @@ async def create_job(req: CreateJobRequest):
     asyncio.create_task(runner.run_job(job_id))
     return {"job_id": job_id}
 
+@app.post("/reextract")
+async def create_reextract_job(req: ReextractRequest):
+    cfg_json = ScraperConfig.from_dict(req.config).dump()
+    job_id = db.create_job(cfg_json, None, None)
+    asyncio.create_task(runner.run_reextract(job_id, only_new=req.only_new, workers=req.workers))
+    return {"job_id": job_id}
+
 @app.get("/jobs", response_model=List[JobDTO])
 def list_jobs():
-    rows = db.list_jobs(100)
-    out = []
-    for r in rows:
-        out.append(JobDTO(
-            id=r["id"], status=r["status"], created_at=r["created_at"],
-            updated_at=r["updated_at"], depth=r["depth"], max_pages=r["max_pages"]
-        ))
-    return out
+    rows = pool.reader().list_jobs(100)
+    return [_job_dto(r) for r in rows]
 
 @app.get("/jobs/{job_id}", response_model=JobDTO)
 def get_job(job_id: int):
-    r = db.get_job(job_id)
+    r = pool.reader().get_job(job_id)
     if not r:
         return {"detail": "not found"}
-    return JobDTO(
-        id=r["id"], status=r["status"], created_at=r["created_at"],
-        updated_at=r["updated_at"], depth=r["depth"], max_pages=r["max_pages"]
-    )
+    return _job_dto(r)
 
 @app.get("/jobs/{job_id}/events", response_model=List[EventDTO])
 def get_events(job_id: int, after_id: int = 0, limit: int = 100):
-    rows = db.recent_events(job_id, after_id=after_id, limit=limit)
+    rows = pool.reader().recent_events(job_id, after_id=after_id, limit=limit)
     out = []
     for r in rows:
         out.append(EventDTO(
@@ -75,12 +89,27 @@ def get_events(job_id: int, after_id: int = 0, limit: int = 100):
 
 @app.get("/items")
 def list_items(job_id: int | None = None, limit: int = 100):
-    cur = db.conn.cursor()
-    if job_id:
-        cur.execute("SELECT id, page_id, job_id, data_json, created_at FROM items WHERE job_id=? ORDER BY id DESC LIMIT ?", (job_id, limit))
+    reader = pool.reader()
+    shard = reader.get_shard(job_id) if job_id else None
+    if shard:
+        src, table = DB(Path(shard["path"]), readonly=True), "items"
+    elif not job_id and reader.active_shards():
+        try:
+            src, table = open_view(DB_PATH), "all_items"
+        except ValueError as ex:
+            raise HTTPException(status_code=409, detail=str(ex))
     else:
-        cur.execute("SELECT id, page_id, job_id, data_json, created_at FROM items ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
+        src, table = reader, "items"
+    try:
+        cur = src.conn.cursor()
+        if job_id:
+            cur.execute(f"SELECT id, page_id, job_id, data_json, created_at FROM {table} WHERE job_id=? ORDER BY id DESC LIMIT ?", (job_id, limit))
+        else:
+            cur.execute(f"SELECT id, page_id, job_id, data_json, created_at FROM {table} ORDER BY created_at DESC, id DESC LIMIT ?", (limit,))
+        rows = cur.fetchall()
+    finally:
+        if src is not reader:
+            src.close()
     return [
         {
             "id": r["id"], "page_id": r["page_id"], "job_id": r["job_id"],
@@ -89,6 +118,14 @@ def list_items(job_id: int | None = None, limit: int = 100):
         for r in rows
     ]
 
+@app.get("/search", response_model=List[SearchHit])
+def search(q: str, kind: str = "all", limit: int = 20):
+    reader = pool.reader()
+    if not reader.fts:
+        raise HTTPException(status_code=501, detail="FTS5 not available")
+    hits = reader.search(q, kind=kind, limit=limit, marks=("<mark>", "</mark>"))
+    return [SearchHit(**h) for h in hits]
+
 @app.websocket("/ws/jobs/{job_id}")
 async def ws_job_updates(ws: WebSocket, job_id: int):
     await ws_manager.connect(job_id, ws)
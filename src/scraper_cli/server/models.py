@@ -6,6 +6,11 @@ class CreateJobRequest(BaseModel):
     depth: Optional[int] = None
     max_pages: Optional[int] = None
 
+class ReextractRequest(BaseModel):
+    config: Dict[str, Any]
+    only_new: bool = True
+    workers: Optional[int] = None
+
 class JobDTO(BaseModel):
     id: int
     status: str
@@ -13,6 +18,13 @@ class JobDTO(BaseModel):
     updated_at: str
     depth: Optional[int] = None
     max_pages: Optional[int] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    pages: int = 0
+    items: int = 0
+    errors: int = 0
+    bytes: int = 0
+    pages_per_s: Optional[float] = None
 
 class EventDTO(BaseModel):
     id: int
@@ -27,3 +39,11 @@ class ItemRow(BaseModel):
     job_id: Optional[int]
     data_json: Dict[str, Any]
     created_at: str
+
+class SearchHit(BaseModel):
+    kind: str  # page|item
+    id: int
+    url: Optional[str] = None
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+    score: float
@@ -1,15 +1,64 @@
 import asyncio
 import json
+import time
+from pathlib import Path
 from typing import Optional
 from ..db import DB
 from ..config import ScraperConfig
 from ..fetcher import crawl
+from ..reextract import reextract
+from ..shards import open_shard
 from .ws import WSManager
 
+class JobProgress:
+    """
+    Buffers a job's events and counter deltas and writes them in one transaction every
+    `flush_every` events or `flush_secs` seconds, instead of one commit per page.
+    """
+
+    def __init__(self, db: DB, job_id: int, flush_every: int = 50, flush_secs: float = 1.0):
+        self.db = db
+        self.job_id = job_id
+        self.flush_every = flush_every
+        self.flush_secs = flush_secs
+        self._events = []
+        self._pages = self._items = self._errors = self._bytes = 0
+        self._abs_pages = self._abs_items = 0  # last absolute totals from "progress" events
+        self._last_flush = time.monotonic()
+
+    def add(self, ev: dict):
+        ev_type = ev.get("type", "info")
+        if ev_type == "page":
+            self._pages += 1
+            self._errors += int(bool(ev.get("error")))
+            self._bytes += int(ev.get("bytes") or 0)
+        elif ev_type == "items":
+            self._items += int(ev.get("count") or 0)
+        elif ev_type == "progress":
+            self._pages += ev.get("pages", 0) - self._abs_pages
+            self._items += ev.get("items", 0) - self._abs_items
+            self._abs_pages, self._abs_items = ev.get("pages", 0), ev.get("items", 0)
+        self._events.append((ev_type, ev))
+        if len(self._events) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_secs:
+            self.flush()
+
+    def flush(self):
+        if self._events:
+            self.db.record_job_progress(
+                self.job_id, self._events, pages=self._pages, items=self._items,
+                errors=self._errors, nbytes=self._bytes,
+            )
+        self._events = []
+        self._pages = self._items = self._errors = self._bytes = 0
+        self._last_flush = time.monotonic()
+
+
 class JobRunner:
-    def __init__(self, db: DB, ws: WSManager):
+    def __init__(self, db: DB, ws: WSManager, shard_dir: Optional[Path] = None):
         self.db = db
         self.ws = ws
+        # when set, each crawl job writes pages/items to its own shard file under shard_dir
+        self.shard_dir = shard_dir
 
     async def run_job(self, job_id: int):
         job = self.db.get_job(job_id)
@@ -30,18 +79,54 @@ class JobRunner:
         self.db.update_job_status(job_id, "running")
         self.db.add_job_event(job_id, "info", {"message": "job started"})
 
+        progress = JobProgress(self.db, job_id)
+
         def on_event(ev: dict):
-            # store event and push via ws
-            self.db.add_job_event(job_id, ev.get("type", "info"), ev)
+            # buffer event/counters and push via ws
+            progress.add(ev)
             # fire-and-forget (no await inside sync cb)
             asyncio.create_task(self.ws.broadcast(job_id, {"job_id": job_id, **ev}))
 
+        crawl_db = open_shard(self.db, self.shard_dir, job_id) if self.shard_dir else self.db
         try:
-            await crawl(cfg, self.db, max_pages=max_pages, job_id=job_id, on_event=on_event)
+            await crawl(cfg, crawl_db, max_pages=max_pages, job_id=job_id, on_event=on_event)
+            progress.flush()
             self.db.update_job_status(job_id, "succeeded")
             self.db.add_job_event(job_id, "done", {"message": "job completed"})
             await self.ws.broadcast(job_id, {"type": "done", "job_id": job_id})
         except Exception as ex:
+            progress.flush()
+            self.db.update_job_status(job_id, "failed")
+            self.db.add_job_event(job_id, "error", {"message": repr(ex)})
+            await self.ws.broadcast(job_id, {"type": "error", "job_id": job_id, "message": repr(ex)})
+        finally:
+            if crawl_db is not self.db:
+                crawl_db.close()
+
+    async def run_reextract(self, job_id: int, only_new: bool = True, workers: Optional[int] = None):
+        job = self.db.get_job(job_id)
+        if not job:
+            return
+        cfg = ScraperConfig.load_json_str(job["config_json"])
+
+        self.db.update_job_status(job_id, "running")
+        self.db.add_job_event(job_id, "info", {"message": "reextract started"})
+
+        progress = JobProgress(self.db, job_id)
+
+        def on_event(ev: dict):
+            progress.add(ev)
+            asyncio.create_task(self.ws.broadcast(job_id, {"job_id": job_id, **ev}))
+
+        try:
+            stats = await reextract(cfg, self.db, job_id=job_id, workers=workers,
+                                    only_new=only_new, on_event=on_event)
+            progress.flush()
+            self.db.update_job_status(job_id, "succeeded")
+            self.db.add_job_event(job_id, "done", {"message": "reextract completed", **stats})
+            await self.ws.broadcast(job_id, {"type": "done", "job_id": job_id})
+        except Exception as ex:
+            progress.flush()
             self.db.update_job_status(job_id, "failed")
             self.db.add_job_event(job_id, "error", {"message": repr(ex)})
             await self.ws.broadcast(job_id, {"type": "error", "job_id": job_id, "message": repr(ex)})
@@ -0,0 +1,117 @@
+from __future__ import annotations
+import sqlite3
+from pathlib import Path
+from typing import List, Optional, Sequence
+from .db import DB
+
+# SQLite's default SQLITE_MAX_ATTACHED; one slot is left for the caller
+MAX_ATTACH = 9
+
+# Tables exposed as cross-shard TEMP views (all_<table>) by attach_shards
+UNION_TABLES = {
+    "pages": "id, url, domain, status, etag, last_modified, content_hash, html, error, fetched_at, depth",
+    "items": "id, page_id, job_id, data_json, created_at, content_hash, config_hash",
+    "links": "from_page_id, to_url",
+}
+
+
+def shard_path(shard_dir: Path, job_id: int) -> Path:
+    return Path(shard_dir) / f"job-{job_id}.db"
+
+
+def open_shard(catalog: DB, shard_dir: Path, job_id: int) -> DB:
+    """
+    Create (or reopen) a job's shard and register it in the catalog's shards table. A new
+    shard is seeded with the catalog's recrawl schedule and trap statistics, and reads pages
+    it has not fetched itself (ETag/Last-Modified, sitemap lastmod, --recrawl) from the
+    catalog; pages of other unmerged shards are only seen once they are merged.
+    """
+    path = shard_path(shard_dir, job_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new = not path.exists()
+    shard = DB(path)
+    if new:
+        shard.seed_crawl_state(str(catalog.path))
+    shard.prior = DB(catalog.path, readonly=True)
+    catalog.register_shard(job_id, str(path))
+    return shard
+
+
+def attach_shards(conn: sqlite3.Connection, paths: Sequence[str]) -> List[str]:
+    """
+    ATTACH shard files read-only and (re)create TEMP views all_pages/all_items/all_links
+    that union main with every attached shard. Each view row carries its `shard` alias.
+    More than MAX_ATTACH shards is an error: merge some into the catalog first.
+    """
+    if len(paths) > MAX_ATTACH:
+        raise ValueError(
+            f"{len(paths)} active shards, but at most {MAX_ATTACH} can be queried together; "
+            "run `merge` to fold finished jobs into the catalog"
+        )
+    aliases = []
+    for i, p in enumerate(paths):
+        alias = f"shard{i}"
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (Path(p).resolve().as_uri() + "?mode=ro",))
+        aliases.append(alias)
+    # TEMP views live in the temp schema; every file is still opened mode=ro
+    query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+    conn.execute("PRAGMA query_only = 0")
+    try:
+        for table, cols in UNION_TABLES.items():
+            parts = [f"SELECT 'main' AS shard, {cols} FROM main.{table}"]
+            parts += [f"SELECT '{a}', {cols} FROM {a}.{table}" for a in aliases]
+            conn.execute(f"DROP VIEW IF EXISTS temp.all_{table}")
+            conn.execute(f"CREATE TEMP VIEW all_{table} AS " + " UNION ALL ".join(parts))
+    finally:
+        conn.execute(f"PRAGMA query_only = {int(query_only)}")
+    return aliases
+
+
+def open_view(catalog_path: Path) -> DB:
+    """Read-only catalog connection with every active shard attached (at most MAX_ATTACH)."""
+    db = DB(catalog_path, readonly=True)
+    try:
+        # readonly DBs are opened with uri=True, so the mode=ro ATTACH URIs are honoured
+        attach_shards(db.conn, [r["path"] for r in db.active_shards()])
+    except Exception:
+        db.close()
+        raise
+    return db
+
+
+def merge_shards(catalog: DB, job_ids: Optional[Sequence[int]] = None, delete: bool = True) -> int:
+    """
+    Fold shards into the catalog DB: pages are upserted by URL (newest fetch wins), items
+    (and typed items tables), links and fetch history are re-keyed to the catalog's page ids.
+    Returns shards merged.
+    """
+    merged = 0
+    for row in catalog.active_shards():
+        if job_ids and row["job_id"] not in job_ids:
+            continue
+        path = Path(row["path"])
+        if path.exists():
+            # opened once so a shard written by an older version gets the current schema
+            DB(path).close()
+            catalog.merge_shard_file(str(path))
+        catalog.mark_shard_merged(row["job_id"])
+        if delete:
+            for suffix in ("", "-wal", "-shm"):
+                Path(str(path) + suffix).unlink(missing_ok=True)
+        merged += 1
+    return merged
+
+
+def vacuum_all(catalog: DB) -> int:
+    """VACUUM the catalog and every active shard; returns files vacuumed."""
+    n = 0
+    for row in catalog.active_shards():
+        if Path(row["path"]).exists():
+            shard = DB(Path(row["path"]))
+            try:
+                shard.conn.execute("VACUUM")
+            finally:
+                shard.close()
+            n += 1
+    catalog.conn.execute("VACUUM")
+    return n + 1
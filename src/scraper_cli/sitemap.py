@@ -0,0 +1,100 @@
+from __future__ import annotations
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+from urllib.parse import urlparse
+import httpx
+from lxml import etree
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def default_sitemap(url: str) -> str:
+    p = urlparse(url)
+    return f"{p.scheme}://{p.netloc}/sitemap.xml"
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[str]:
+    """W3C datetime (date, or datetime with offset) → UTC in the DB's fetched_at format."""
+    if not value:
+        return None
+    value = value.strip().replace("Z", "+00:00")
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _local(tag) -> str:
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+
+def _child_text(el, name: str) -> Optional[str]:
+    for c in el:
+        if _local(c.tag) == name:
+            return (c.text or "").strip() or None
+    return None
+
+
+async def _stream_entries(
+    client: httpx.AsyncClient, url: str, headers: dict
+) -> AsyncIterator[Tuple[str, str, Optional[str]]]:
+    """
+    Yield (kind, loc, lastmod) for every <url> or <sitemap> entry, feeding the body to a
+    pull parser chunk by chunk (gunzipping on the fly) and dropping parsed elements.
+    """
+    parser = etree.XMLPullParser(events=("end",), resolve_entities=False, no_network=True)
+    gunzip = None
+    async with client.stream("GET", url, headers=headers, timeout=httpx.Timeout(10.0, read=30.0),
+                             follow_redirects=True) as r:
+        if r.status_code != 200:
+            return
+        first = True
+        async for chunk in r.aiter_bytes():
+            if first:
+                first = False
+                if chunk[:2] == _GZIP_MAGIC:
+                    gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            parser.feed(gunzip.decompress(chunk) if gunzip else chunk)
+            for _, el in parser.read_events():
+                kind = _local(el.tag)
+                if kind not in ("url", "sitemap"):
+                    continue
+                loc = _child_text(el, "loc")
+                lastmod = _child_text(el, "lastmod")
+                # constant memory: drop this entry and everything before it
+                el.clear()
+                parent = el.getparent()
+                if parent is not None:
+                    while el.getprevious() is not None:
+                        del parent[0]
+                if loc:
+                    yield kind, loc, lastmod
+        if gunzip:
+            parser.feed(gunzip.flush())
+        parser.close()
+
+
+async def iter_sitemap_urls(
+    client: httpx.AsyncClient, sitemaps: List[str], headers: dict, max_sitemaps: int = 50
+) -> AsyncIterator[Tuple[str, Optional[str]]]:
+    """Walk sitemaps and sitemap indexes breadth-first, yielding (page_url, lastmod)."""
+    queue = list(dict.fromkeys(sitemaps))
+    seen = set(queue)
+    fetched = 0
+    while queue and fetched < max_sitemaps:
+        sm = queue.pop(0)
+        fetched += 1
+        try:
+            async for kind, loc, lastmod in _stream_entries(client, sm, headers):
+                if kind == "sitemap":
+                    if loc not in seen:
+                        seen.add(loc)
+                        queue.append(loc)
+                else:
+                    yield loc, parse_lastmod(lastmod)
+        except (httpx.HTTPError, etree.XMLSyntaxError, zlib.error):
+            continue  # a broken sitemap shouldn't stop the crawl
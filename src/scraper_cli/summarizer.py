@@ -1,9 +1,33 @@
 from __future__ import annotations
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
 import re
 from collections import Counter
+from itertools import repeat
+from .db import DB
+from .utils import hash_text
 
-_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+# Text blocks shorter than this (nav entries, link labels, buttons) are not sentences
+MIN_SENTENCE_WORDS = 4
+
+def split_sentences(text: str) -> List[str]:
+    parts = [s.strip() for s in _SENT_SPLIT.split(text) if s.strip()]
+    # very short pages keep their fragments rather than summarizing to nothing
+    return [s for s in parts if len(_WORD.findall(s)) >= MIN_SENTENCE_WORDS] or parts
+
+def term_counts(text: str) -> Counter:
+    return Counter(w for w in _WORD.findall(text.lower()) if len(w) > 2)
+
+def score_sentences(sents: List[str], freq: Dict[str, int]) -> List[float]:
+    """Score a batch of sentences against one frequency table (sum of term freqs / length)."""
+    get = freq.get
+    out = []
+    for s in sents:
+        sw = _WORD.findall(s.lower())
+        out.append(sum(map(get, sw, repeat(0))) / (len(sw) + 1))
+    return out
 
 def summarize_text(text: str, max_sentences: int = 5) -> str:
     """
@@ -12,21 +36,122 @@ def summarize_text(text: str, max_sentences: int = 5) -> str:
     - Score by word frequency (normalized)
     - Return top-N sentences in document order
     """
-    sents = [s.strip() for s in _SENT_SPLIT.split(text) if s.strip()]
+    sents = split_sentences(text)
     if len(sents) <= max_sentences:
         return " ".join(sents)
 
-    words = re.findall(r"\w+", text.lower())
-    freq = Counter(w for w in words if len(w) > 2)
+    freq = term_counts(text)
     if not freq:
         return " ".join(sents[:max_sentences])
 
-    scores = []
-    for i, s in enumerate(sents):
-        sw = re.findall(r"\w+", s.lower())
-        val = sum(freq.get(w, 0) for w in sw) / (len(sw) + 1)
-        scores.append((i, val, s))
-
+    scores = score_sentences(sents, freq)
     # pick top max_sentences by score, then sort by original index
-    top = sorted(sorted(scores, key=lambda x: x[1], reverse=True)[:max_sentences], key=lambda x: x[0])
-    return " ".join(s for _, __, s in top)
+    top = sorted(heapq.nlargest(max_sentences, range(len(sents)), key=scores.__getitem__))
+    return " ".join(sents[i] for i in top)
+
+
+class SummaryPipeline:
+    """
+    Summaries over stored pages:
+    - visible text is extracted once per content hash (page_texts)
+    - corpus term frequencies are updated page by page as bodies change (corpus_terms)
+    - page summaries are memoized in `summaries` by (url, content_hash, sentences)
+    - collection summaries stream page texts and keep only a top-N heap in memory
+    """
+
+    BATCH = 200
+
+    def __init__(self, db: DB):
+        self.db = db
+
+    def page_text(self, html: str, content_hash: str) -> str:
+        text = self.db.get_page_text(content_hash)
+        if text is None:
+            from .parser import visible_text
+            text = visible_text(html)
+            self.db.put_page_text(content_hash, text)
+        return text
+
+    def _row_hash(self, row) -> str:
+        if row["content_hash"]:
+            return row["content_hash"]
+        h = hash_text(row["html"])
+        self.db.set_content_hash(row["id"], h)
+        return h
+
+    def sync_corpus(self) -> int:
+        """Fold pages whose body changed since the last sync into corpus_terms; returns count."""
+        ids = self.db.corpus_pending()
+        cur = self.db.conn.cursor()
+        for i in range(0, len(ids), self.BATCH):
+            chunk = ids[i:i + self.BATCH]
+            cur.execute(
+                f"SELECT id, url, html, content_hash FROM pages WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for row in cur.fetchall():
+                new_hash = self._row_hash(row)
+                old_hash = self.db.corpus_hash(row["url"])
+                if old_hash == new_hash:
+                    continue
+                tf = term_counts(self.page_text(row["html"], new_hash))
+                if old_hash:
+                    old_text = self.db.get_page_text(old_hash)
+                    if old_text is not None:
+                        tf.subtract(term_counts(old_text))
+                self.db.apply_corpus_delta(row["url"], new_hash, dict(tf))
+        return len(ids)
+
+    def summarize_page(self, url: str, max_sentences: int = 5) -> Optional[str]:
+        row = self.db.get_page(url)
+        if not row or not row["html"]:
+            return None
+        content_hash = self._row_hash(row)
+        cached = self.db.get_summary("page", url, content_hash, max_sentences)
+        if cached is not None:
+            return cached
+        summ = summarize_text(self.page_text(row["html"], content_hash), max_sentences)
+        self.db.insert_summary("page", url, summ, content_hash=content_hash, sentences=max_sentences)
+        return summ
+
+    def _iter_texts(self) -> Iterable[Tuple[int, str]]:
+        cur = self.db.conn.cursor()
+        cur.execute(
+            """SELECT p.id, t.text FROM pages p JOIN page_texts t ON t.content_hash = p.content_hash
+               WHERE p.html IS NOT NULL AND p.error IS NULL ORDER BY p.id"""
+        )
+        while True:
+            rows = cur.fetchmany(self.BATCH)
+            if not rows:
+                return
+            for r in rows:
+                yield r["id"], r["text"]
+
+    def summarize_collection(self, max_sentences: int = 5) -> str:
+        self.sync_corpus()
+        signature = self.db.corpus_signature()
+        cached = self.db.get_summary("collection", "all", signature, max_sentences)
+        if cached is not None:
+            return cached
+
+        freq = self.db.corpus_term_freqs()
+        # min-heap of (score, -page_id, -sent_idx, sentence); ties favour earlier sentences
+        heap: List[Tuple[float, int, int, str]] = []
+        chosen = set()
+        for page_id, text in self._iter_texts():
+            sents = split_sentences(text)
+            for idx, (score, s) in enumerate(zip(score_sentences(sents, freq), sents)):
+                if s in chosen:
+                    continue  # boilerplate repeated across pages
+                entry = (score, -page_id, -idx, s)
+                if len(heap) < max_sentences:
+                    heapq.heappush(heap, entry)
+                    chosen.add(s)
+                elif entry > heap[0]:
+                    chosen.discard(heapq.heapreplace(heap, entry)[3])
+                    chosen.add(s)
+
+        top = sorted(heap, key=lambda e: (-e[1], -e[2]))
+        summ = " ".join(e[3] for e in top)
+        self.db.insert_summary("collection", "all", summ, content_hash=signature, sentences=max_sentences)
+        return summ
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional
+from .config import ScraperConfig
+
+# Responses that mean "slow down" rather than "this page is broken"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP-date; return seconds to wait."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base_ms: int, max_ms: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff in seconds, never shorter than Retry-After."""
+    cap = min(max_ms, base_ms * (2 ** attempt)) / 1000.0
+    delay = random.uniform(0, cap)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_ms / 1000.0))
+    return delay
+
+
+class HostLimiter:
+    """
+    AIMD in-flight limit for one host:
+    - additive increase (+1 per window of successes) while latency stays near the baseline
+    - multiplicative decrease on 429/5xx/timeouts, plus a cool-down before the next request
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, adaptive: bool = True):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum if adaptive else initial)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.min_latency: Optional[float] = None
+        self.resume_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            while self.in_flight >= int(self.limit):
+                await self._cond.wait()
+            self.in_flight += 1
+        wait = self.resume_at - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if not self.adaptive:
+            return
+        # Healthy: within 2x of the best latency seen for this host
+        if latency <= self.min_latency * 2 + 0.05:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        elif latency > self.min_latency * 4:
+            self.limit = max(self.minimum, self.limit * 0.9)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        if self.adaptive:
+            self.limit = max(self.minimum, self.limit / 2)
+        if retry_after:
+            self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+
+
+class ThrottleRegistry:
+    """One HostLimiter per netloc, created on first use."""
+
+    def __init__(self, cfg: ScraperConfig):
+        self.cfg = cfg
+        self._hosts: Dict[str, HostLimiter] = {}
+
+    def get(self, host: str) -> HostLimiter:
+        lim = self._hosts.get(host)
+        if lim is None:
+            lim = HostLimiter(
+                initial=self.cfg.concurrency,
+                maximum=self.cfg.max_concurrency,
+                adaptive=self.cfg.adaptive_concurrency,
+            )
+            self._hosts[host] = lim
+        return lim
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[HostLimiter]:
+        lim = self.get(host)
+        await lim.acquire()
+        try:
+            yield lim
+        finally:
+            await lim.release()
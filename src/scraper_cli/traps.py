@@ -0,0 +1,158 @@
+from __future__ import annotations
+import hashlib
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Set, Tuple
+from urllib.parse import parse_qsl, urlparse
+from .config import ScraperConfig
+from .db import DB
+
+_WORD = re.compile(r"\w+")
+_NUM = re.compile(r"^\d+$")
+_ID = re.compile(r"^(?=.*\d)[0-9a-fA-F-]{8,}$")
+_DATE = re.compile(r"^\d{4}-\d{1,2}(-\d{1,2})?$")
+
+OK, DEMOTE, PRUNE = "ok", "demote", "prune"
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """64-bit SimHash over word 3-shingles; near-identical texts differ in few bits."""
+    words = _WORD.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    acc = [0] * bits
+    for sh in shingles:
+        h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big")
+        for b in range(bits):
+            acc[b] += 1 if (h >> b) & 1 else -1
+    return sum(1 << b for b in range(bits) if acc[b] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_sql_int(v: int) -> int:
+    # SQLite INTEGER is signed 64-bit
+    return v - (1 << 64) if v >= (1 << 63) else v
+
+
+def url_template(url: str) -> Tuple[str, str, str]:
+    """
+    (template, path template, query combo). Numeric/id/date path segments become
+    placeholders; the template also records which query keys are present, and the combo
+    is the concrete (sorted) query string.
+    """
+    p = urlparse(url)
+    segs = []
+    for seg in p.path.split("/"):
+        if _NUM.match(seg):
+            segs.append("{n}")
+        elif _DATE.match(seg):
+            segs.append("{date}")
+        elif _ID.match(seg):
+            segs.append("{id}")
+        else:
+            segs.append(seg)
+    params = sorted(parse_qsl(p.query, keep_blank_values=True))
+    keys = ",".join(sorted({k for k, _ in params}))
+    path_template = f"{p.netloc.lower()}{'/'.join(segs)}"
+    template = path_template + (f"?{keys}" if keys else "")
+    return template, path_template, "&".join(f"{k}={v}" for k, v in params)
+
+
+def page_fingerprint(db: DB, html: str, content_hash: str, soup=None) -> int:
+    # reuses the visible text cached by the search index / summarizer when present
+    text = db.get_page_text(content_hash)
+    if text is None:
+        from .parser import visible_text
+        text = visible_text(html, soup)
+        db.put_page_text(content_hash, text)
+    return simhash(text)
+
+
+@dataclass
+class PatternStats:
+    pages: int = 0
+    near_dups: int = 0
+    query_variants: int = 0
+    pruned: int = 0
+    recent: Deque[int] = field(default_factory=lambda: deque(maxlen=32))
+    combos: Set[str] = field(default_factory=set)
+
+
+class TrapDetector:
+    """
+    Per-URL-template statistics used to keep crawler traps (calendars, faceted search,
+    session ids) from eating the page budget: templates whose pages are mostly near-
+    duplicates get demoted, then pruned; templates whose query combinations keep
+    multiplying stop admitting new combinations. Near-duplicate counts are kept per
+    template, query-combination counts per path template (so added facets still count).
+    """
+
+    def __init__(self, cfg: ScraperConfig, db: DB):
+        self.cfg = cfg
+        self.db = db
+        self.stats: Dict[str, PatternStats] = {}
+        # URLs already counted in a template's pruned total (verdict runs at enqueue and dequeue)
+        self._pruned_urls: Set[str] = set()
+        self._new_combos: Set[Tuple[str, str]] = set()
+        for r in db.load_url_patterns():
+            self.stats[r["template"]] = PatternStats(
+                pages=r["pages"], near_dups=r["near_dups"],
+                query_variants=r["query_variants"], pruned=r["pruned"],
+            )
+        for path_template, combo in db.load_url_pattern_combos():
+            self._get(path_template).combos.add(combo)
+
+    def _get(self, template: str) -> PatternStats:
+        st = self.stats.get(template)
+        if st is None:
+            st = self.stats[template] = PatternStats()
+        return st
+
+    def observe(self, url: str, fingerprint: int) -> bool:
+        """Record a fetched page; returns True if it is a near-duplicate of its template's pages."""
+        template, path_template, combo = url_template(url)
+        st = self._get(template)
+        dup = any(hamming(fingerprint, f) <= self.cfg.near_dup_threshold for f in st.recent)
+        st.pages += 1
+        st.near_dups += int(dup)
+        st.recent.append(fingerprint)
+        if combo:
+            pst = self._get(path_template)
+            if combo not in pst.combos:
+                pst.combos.add(combo)
+                self._new_combos.add((path_template, combo))
+                pst.query_variants = max(pst.query_variants, len(pst.combos))
+        return dup
+
+    def _prune(self, url: str, st: PatternStats) -> str:
+        if url not in self._pruned_urls:
+            self._pruned_urls.add(url)
+            st.pruned += 1
+        return PRUNE
+
+    def verdict(self, url: str) -> str:
+        template, path_template, combo = url_template(url)
+        pst = self.stats.get(path_template)
+        if combo and pst and combo not in pst.combos and pst.query_variants >= self.cfg.max_query_variants:
+            return self._prune(url, pst)
+        st = self.stats.get(template)
+        if st is None:
+            return OK
+        if st.pages >= self.cfg.trap_min_samples:
+            ratio = st.near_dups / st.pages
+            if ratio >= self.cfg.trap_dup_ratio:
+                return self._prune(url, st)
+            if ratio >= self.cfg.trap_dup_ratio / 2:
+                return DEMOTE
+        return OK
+
+    def save(self) -> None:
+        self.db.save_url_patterns(
+            (t, s.pages, s.near_dups, s.query_variants, s.pruned) for t, s in self.stats.items()
+        )
+        # the admitted combinations, so a reloaded saturated path still lets its known URLs through
+        self.db.save_url_pattern_combos(self._new_combos)
+        self._new_combos.clear()
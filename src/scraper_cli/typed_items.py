@@ -0,0 +1,84 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from .config import ScraperConfig
+
+# ExtractRule.dtype → SQLite column type
+SQL_TYPES = {"text": "TEXT", "integer": "INTEGER", "real": "REAL"}
+
+_NON_IDENT = re.compile(r"[^0-9a-zA-Z_]+")
+# Tables/views of the DB schema (db.SCHEMA, FTS_SCHEMA) and the shard views; a typed items
+# table must not reuse one. FTS5 also owns <name>_fts and its <name>_fts_* shadow tables.
+RESERVED_TABLES = {
+    "pages", "links", "items", "summaries", "page_texts", "corpus_pages", "corpus_terms",
+    "fetch_history", "url_schedule", "url_patterns", "url_pattern_combos", "shards", "warc_records", "jobs",
+    "job_events", "extractions", "pages_fts", "pages_fts_content", "pages_fts_state", "items_fts",
+    "all_pages", "all_items", "all_links",
+}
+_RESERVED_PATTERN = re.compile(r"^sqlite_|_fts$|_fts_")
+_NUMBER = re.compile(r"[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+")
+
+
+def is_reserved_table(name: str) -> bool:
+    return name in RESERVED_TABLES or bool(_RESERVED_PATTERN.search(name))
+
+
+def sql_ident(name: str) -> str:
+    ident = _NON_IDENT.sub("_", name).strip("_").lower() or "field"
+    return f"f_{ident}" if ident[0].isdigit() else ident
+
+
+def coerce(value: Any, dtype: str) -> Any:
+    """Best-effort conversion of an extracted string ("$1,299.00", "42 reviews") to dtype."""
+    if value is None or dtype == "text":
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value) if dtype == "integer" else float(value)
+    m = _NUMBER.search(str(value))
+    if not m:
+        return None
+    num = float(m.group(0).replace(",", ""))
+    return int(num) if dtype == "integer" else num
+
+
+@dataclass
+class TypedItemsTable:
+    """A per-config items table with one typed column per ExtractRule."""
+    name: str
+    # (column, sql type, rule name, dtype)
+    columns: List[Tuple[str, str, str, str]] = field(default_factory=list)
+    indexes: List[str] = field(default_factory=list)
+
+    @staticmethod
+    def from_config(cfg: ScraperConfig) -> Optional["TypedItemsTable"]:
+        if not cfg.typed_items or not cfg.extract:
+            return None
+        name = sql_ident(cfg.typed_items_table or f"items_{cfg.name}")
+        if is_reserved_table(name):
+            raise ValueError(
+                f"typed items table name {name!r} clashes with a built-in table; "
+                "set typed_items_table (or the config name) to something else"
+            )
+        table = TypedItemsTable(name=name)
+        seen = {"id", "page_id", "job_id", "created_at"}
+        for rule in cfg.extract:
+            col = sql_ident(rule.name)
+            while col in seen:
+                col += "_"
+            seen.add(col)
+            dtype = rule.dtype or "text"
+            if dtype not in SQL_TYPES:
+                raise ValueError(
+                    f"extract rule {rule.name!r} has unknown dtype {rule.dtype!r}; "
+                    f"use one of {', '.join(SQL_TYPES)}"
+                )
+            table.columns.append((col, SQL_TYPES[dtype], rule.name, dtype))
+            if rule.index:
+                table.indexes.append(col)
+        return table
+
+    def row(self, item_id: int, page_id: int, job_id: Optional[int], created_at: str,
+            item: Dict[str, Any]) -> tuple:
+        return (item_id, page_id, job_id, created_at,
+                *(coerce(item.get(rule), dtype) for _, __, rule, dtype in self.columns))
@@ -0,0 +1,339 @@
+from __future__ import annotations
+import base64
+import gzip
+import hashlib
+import mmap
+import os
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import httpx
+from .db import DB, _now_iso
+
+# Headers describing the on-the-wire framing; the archived payload is already de-chunked
+_SKIP_HEADERS = {b"transfer-encoding"}
+# 304s are archived as revisit records with this profile (no payload of their own)
+REVISIT_NOT_MODIFIED = "http://netpreserve.org/warc/1.1/revisit/server-not-modified"
+# response headers a replayed 304 carries over from the archived capture
+_NOT_MODIFIED_HEADERS = {"etag", "last-modified", "date", "cache-control", "expires", "content-location", "vary"}
+
+
+def _warc_headers(fields: List[Tuple[str, str]]) -> bytes:
+    return ("WARC/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in fields) + "\r\n").encode("utf-8")
+
+
+def _parse_fields(block: bytes) -> Dict[str, str]:
+    out = {}
+    for line in block.decode("utf-8", "replace").split("\r\n")[1:]:
+        k, sep, v = line.partition(":")
+        if sep:
+            out[k.strip()] = v.strip()
+    return out
+
+
+@dataclass
+class WarcRecord:
+    url: str
+    warc_type: str
+    date: str
+    status: Optional[int] = None
+    headers: List[Tuple[str, str]] = field(default_factory=list)
+    payload: bytes = b""  # as received: still Content-Encoding'd
+
+    def to_response(self) -> httpx.Response:
+        # httpx undoes Content-Encoding when the body is read, as it would for a live response
+        return httpx.Response(self.status or 200, headers=self.headers, content=self.payload)
+
+    @property
+    def text(self) -> str:
+        return self.to_response().text
+
+
+def parse_record(data: bytes) -> WarcRecord:
+    """Parse one uncompressed WARC record; response/revisit records get their HTTP status line and headers split out."""
+    head, _, rest = data.partition(b"\r\n\r\n")
+    fields = _parse_fields(head)
+    block = rest[:int(fields.get("Content-Length", len(rest)))]
+    rec = WarcRecord(
+        url=fields.get("WARC-Target-URI", ""), warc_type=fields.get("WARC-Type", ""),
+        date=fields.get("WARC-Date", ""),
+    )
+    if rec.warc_type not in ("response", "revisit"):
+        rec.payload = block
+        return rec
+    http_head, _, rec.payload = block.partition(b"\r\n\r\n")
+    lines = http_head.decode("iso-8859-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    rec.status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+    for line in lines[1:]:
+        k, sep, v = line.partition(":")
+        if sep:
+            rec.headers.append((k.strip(), v.strip()))
+    return rec
+
+
+def scan_warc(path: Path) -> Iterator[Tuple[int, int, Dict[str, str], Optional[int]]]:
+    """
+    Walk a gzip-per-record WARC file, yielding (offset, compressed length, WARC headers, HTTP status)
+    per record. Every member is decompressed once; use it to build an offset index.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos, end = 0, len(mm)
+        while pos < end:
+            d = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            out = bytearray()
+            i = pos
+            while not d.eof:
+                chunk = mm[i:i + 65536]
+                if not chunk:
+                    raise ValueError(f"{path}: truncated gzip member at offset {pos}")
+                out += d.decompress(chunk)
+                i += len(chunk)
+            length = i - pos - len(d.unused_data)
+            data = bytes(out)
+            yield pos, length, _parse_fields(data.partition(b"\r\n\r\n")[0]), parse_record(data).status
+            pos += length
+
+
+class WarcWriter:
+    """
+    Appends one gzip member per record to rotating .warc.gz files (a new file once the current
+    one passes max_bytes) and records each response's file/offset/length in the DB. A 304 is
+    written as a server-not-modified revisit record and not indexed, so lookups and replay
+    resolve to the last capture with a body.
+    """
+
+    def __init__(self, db: DB, directory: Path, max_bytes: int = 1_000_000_000, prefix: str = "crawl"):
+        self.db = db
+        self.dir = Path(directory).resolve()
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.path: Optional[Path] = None
+        self._f = None
+        self._seq = 0
+
+    def _open(self) -> None:
+        self.close()
+        ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        self.path = self.dir / f"{self.prefix}-{ts}-{os.getpid()}-{self._seq:05d}.warc.gz"
+        self._seq += 1
+        self._f = open(self.path, "ab")
+        info = b"software: scraper-cli\r\nformat: WARC File Format 1.1\r\n"
+        self._append(_warc_headers([
+            ("WARC-Type", "warcinfo"),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", _now_iso()),
+            ("WARC-Filename", self.path.name),
+            ("Content-Type", "application/warc-fields"),
+            ("Content-Length", str(len(info))),
+        ]) + info + b"\r\n\r\n")
+
+    def _append(self, record: bytes) -> Tuple[int, int]:
+        offset = self._f.tell()
+        data = gzip.compress(record)
+        self._f.write(data)
+        # flushed per record so readers can mmap the file while the crawl runs
+        self._f.flush()
+        return offset, len(data)
+
+    def write_response(self, url: str, response: httpx.Response, payload: bytes) -> None:
+        if self._f is None or self._f.tell() >= self.max_bytes:
+            self._open()
+        reason = response.extensions.get("reason_phrase") or httpx.codes.get_reason_phrase(
+            response.status_code).encode("ascii")
+        http_head = b"HTTP/1.1 %d %s\r\n" % (response.status_code, reason)
+        http_head += b"".join(
+            k + b": " + v + b"\r\n" for k, v in response.headers.raw if k.lower() not in _SKIP_HEADERS
+        )
+        date = _now_iso()
+        if response.status_code == 304:
+            block = http_head + b"\r\n"
+            self._append(_warc_headers([
+                ("WARC-Type", "revisit"),
+                ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+                ("WARC-Date", date),
+                ("WARC-Target-URI", url),
+                ("WARC-Profile", REVISIT_NOT_MODIFIED),
+                ("WARC-Refers-To-Target-URI", url),
+                ("Content-Type", "application/http;msgtype=response"),
+                ("Content-Length", str(len(block))),
+            ]) + block + b"\r\n\r\n")
+            return
+        block = http_head + b"\r\n" + payload
+        digest = base64.b32encode(hashlib.sha1(payload).digest()).decode("ascii")
+        offset, length = self._append(_warc_headers([
+            ("WARC-Type", "response"),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", date),
+            ("WARC-Target-URI", url),
+            ("WARC-Payload-Digest", f"sha1:{digest}"),
+            ("Content-Type", "application/http;msgtype=response"),
+            ("Content-Length", str(len(block))),
+        ]) + block + b"\r\n\r\n")
+        self.db.add_warc_record(
+            url, str(self.path), offset, length, response.status_code,
+            response.headers.get("Content-Type"), date,
+        )
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+class WarcReader:
+    """
+    Random access to archived responses by URL: look the URL up in an offset index (the DB's
+    warc_records table, or files scanned with add_file), then decompress just that record's
+    gzip member out of an mmap of its file.
+    """
+
+    def __init__(self, db: Optional[DB] = None):
+        self.db = db
+        self._index: Dict[str, Tuple[str, int, int]] = {}
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def add_file(self, path: Path) -> int:
+        """Index a WARC file in memory (later captures of a URL win); returns responses indexed."""
+        n = 0
+        for offset, length, fields, status in scan_warc(path):
+            # 304s archived as plain responses (older files) have no body; keep the earlier capture
+            if fields.get("WARC-Type") == "response" and status != 304:
+                self._index[fields.get("WARC-Target-URI", "")] = (str(Path(path).resolve()), offset, length)
+                n += 1
+        return n
+
+    def locate(self, url: str) -> Optional[Tuple[str, int, int]]:
+        loc = self._index.get(url)
+        if loc is None and self.db is not None:
+            row = self.db.get_warc_record(url)
+            if row:
+                loc = (row["file"], row["offset"], row["length"])
+        return loc
+
+    def _map(self, path: str, end: int) -> mmap.mmap:
+        mm = self._maps.get(path)
+        if mm is None or len(mm) < end:
+            # (re)map: the file may have grown since it was first mapped
+            if mm is not None:
+                mm.close()
+            with open(path, "rb") as f:
+                mm = self._maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mm
+
+    def get(self, url: str) -> Optional[WarcRecord]:
+        loc = self.locate(url)
+        if loc is None:
+            return None
+        path, offset, length = loc
+        mm = self._map(path, offset + length)
+        return parse_record(gzip.decompress(mm[offset:offset + length]))
+
+    def close(self) -> None:
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+
+def index_warc(db: DB, path: Path) -> int:
+    """Store the offsets of a WARC file's response records in the DB; returns records indexed."""
+    path = Path(path).resolve()
+    n = 0
+    for offset, length, fields, status in scan_warc(path):
+        if fields.get("WARC-Type") != "response" or status == 304:
+            continue
+        db.add_warc_record(
+            fields.get("WARC-Target-URI", ""), str(path), offset, length, status,
+            None, fields.get("WARC-Date", ""), commit=False,
+        )
+        n += 1
+    db.conn.commit()
+    return n
+
+
+class _TeeStream(httpx.AsyncByteStream):
+    # passes body chunks through unchanged and hands the complete raw body to on_done
+    def __init__(self, inner: httpx.AsyncByteStream, on_done: Callable[[bytes], None]):
+        self._inner = inner
+        self._on_done = on_done
+        self._chunks: List[bytes] = []
+        self._complete = False
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            self._chunks.append(chunk)
+            yield chunk
+        self._complete = True
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+        if self._complete:
+            self._complete = False
+            self._on_done(b"".join(self._chunks))
+        self._chunks = []
+
+
+class ArchivingTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport and writes every fully read response to a WarcWriter (closed with the client)."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, writer: WarcWriter):
+        self.inner = inner
+        self.writer = writer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        url = str(request.url)
+        if isinstance(response.stream, httpx.ByteStream):
+            # in-memory body (mock/replay transports): archive the raw bytes right away
+            self.writer.write_response(url, response, b"".join(response.stream))
+        else:
+            response.stream = _TeeStream(
+                response.stream, lambda payload: self.writer.write_response(url, response, payload)
+            )
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+        self.writer.close()
+
+
+def _not_modified(request: httpx.Request, rec: WarcRecord) -> bool:
+    # the request's validators against the archived capture (If-None-Match takes precedence)
+    headers = httpx.Headers(rec.headers)
+    inm = request.headers.get("If-None-Match")
+    if inm is not None:
+        etag = headers.get("ETag")
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        return etag is not None and ("*" in tags or etag.removeprefix("W/") in tags)
+    ims, lm = request.headers.get("If-Modified-Since"), headers.get("Last-Modified")
+    if ims is None or lm is None:
+        return False
+    try:
+        return parsedate_to_datetime(lm) <= parsedate_to_datetime(ims)
+    except (TypeError, ValueError):
+        return ims == lm
+
+
+class WarcReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves GET requests from a WarcReader instead of the network; unarchived URLs get a 404.
+    A request whose validators match the archived capture gets a 304, as the server would.
+    """
+
+    def __init__(self, reader: WarcReader):
+        self.reader = reader
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        rec = self.reader.get(str(request.url)) if request.method == "GET" else None
+        if rec is None:
+            return httpx.Response(404, headers={"Content-Type": "text/plain"}, content=b"not archived")
+        if rec.status == 200 and _not_modified(request, rec):
+            return httpx.Response(
+                304, headers=[(k, v) for k, v in rec.headers if k.lower() in _NOT_MODIFIED_HEADERS]
+            )
+        return rec.to_response()
@@ -1,6 +1,9 @@
 export type Job = {
   id: number; status: string; created_at: string; updated_at: string;
   depth?: number | null; max_pages?: number | null;
+  started_at?: string | null; finished_at?: string | null;
+  pages: number; items: number; errors: number; bytes: number;
+  pages_per_s?: number | null;
 };
 
 export type Event = {